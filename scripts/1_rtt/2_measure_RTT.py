@@ -1,6 +1,8 @@
 import pandas as pd
-import subprocess
-import statistics
+
+from webclient.batch import probe
+from webclient.histogram import probe_histograms
+from webclient.resolver import Resolver
 
 INPUT_CSV = "data/1_rtt/universities.csv"
 OUTPUT_CSV = "data/1_rtt/universities_with_rtt.csv"
@@ -9,32 +11,30 @@ df = pd.read_csv(INPUT_CSV)
 
 ips = []
 rtts = []
+# Repeated probes of a domain resolve it once
+resolver = Resolver()
 for domain in df["Domain"]:
     print(f"Pinging {domain}...")
     ip = None
-    rtt_values = []
-    for _ in range(20):
+    histograms = probe_histograms()
+    # Probe in-process instead of spawning a webclient per sample
+    for run in range(20):
         try:
-            result = subprocess.run(
-                ["webclient", domain, "-ping"],
-                capture_output=True,
-                text=True,
-                check=True,
-            )
-            output = result.stdout.strip()
-            parts = output.split()
-            if len(parts) >= 4 and parts[1] == "RTT":
-                if ip is None:
-                    ip = parts[0]
-                rtt = float(parts[2])
-                rtt_values.append(rtt)
+            record = probe(domain, run=run, resolver=resolver, histograms=histograms)
         except Exception as e:
             print(f"Error with {domain}: {e}")
-    if rtt_values:
-        min_rtt = min(rtt_values)
-        max_rtt = max(rtt_values)
-        median_rtt = statistics.median(rtt_values)
-        mean_rtt = statistics.mean(rtt_values)
+            continue
+        if record["error"]:
+            print(f"Error with {domain}: {record['error']}")
+            continue
+        if ip is None:
+            ip = record["ip"]
+    rtt_histogram = histograms["connect"]
+    if rtt_histogram.count:
+        min_rtt = rtt_histogram.min
+        max_rtt = rtt_histogram.max
+        median_rtt = rtt_histogram.percentile(50)
+        mean_rtt = rtt_histogram.mean
     else:
         min_rtt = max_rtt = median_rtt = mean_rtt = None
     ips.append(ip)
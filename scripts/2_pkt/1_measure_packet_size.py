@@ -1,39 +1,47 @@
+import os
+
 import pandas as pd
-import subprocess
-import re
+
+from webclient.batch import probe
+from webclient.histogram import Histogram
+from webclient.tracestore import TraceStore
 
 
 INPUT_FILE = "data/2_pkt/mirrors.csv"
 INPUT_FILE_2 = "data/1_rtt/universities.csv"
 OUTPUT_FILE = "data/2_pkt/mirrors_packets.csv"
 OUTPUT_FILE_2 = "data/2_pkt/universities_packets.csv"
+# Packet sizes and times of every probe, indexed by host and path
+TRACE_STORE_FILE = "data/2_pkt/packets.wct"
 
 df = pd.read_csv(INPUT_FILE)
 df_2 = pd.read_csv(INPUT_FILE_2)
 
+# The store is append-only, start from an empty one
+if os.path.exists(TRACE_STORE_FILE):
+    os.remove(TRACE_STORE_FILE)
+store = TraceStore(TRACE_STORE_FILE)
+
 
 def measure_packet_info(row, domain_col="Domain", file_col=None):
     mirror = row[domain_col].strip()
     file_path = row[file_col].strip() if file_col else "/"
-    command = ["webclient", mirror, "80", file_path, "-pkt"]
-    result = subprocess.run(command, capture_output=True, text=True)
-    matches = re.findall(r"(\d+) bytes (\d+) ms", result.stdout)
-    bytes_list = [int(m[0]) for m in matches]
-    cumulative_bytes = [sum(bytes_list[: i + 1]) for i in range(len(bytes_list))]
-    time_list = [int(m[1]) for m in matches]
+    # Exact buckets for sizes up to 32K, more than the receive buffer
+    packet_histogram = Histogram(sub_bucket_bits=15, scale=1)
+    record = probe(mirror, 80, file_path, histograms={"chunk_size": packet_histogram})
+    bytes_list = record["packet_sizes"] or []
+    time_list = record["packet_times"] or []
+    store.append(bytes_list, time_list, host=mirror, port=80, path=file_path, run=0)
     total_size = sum(bytes_list)
-    total_time = sum(time_list)
+    total_time = sum(int(t) for t in time_list)
 
-    packet_min = min(bytes_list[1:])
-    packet_max = max(bytes_list[1:])
-    packet_mode = pd.Series(bytes_list[1:]).mode()[0]
-    packet_median = pd.Series(bytes_list[1:]).median()
+    packet_min = packet_histogram.min
+    packet_max = packet_histogram.max
+    packet_mode = packet_histogram.mode()
+    packet_median = packet_histogram.percentile(50)
 
     return pd.Series(
         {
-            "Packet Bytes": str(bytes_list),
-            "Cumulative Bytes": str(cumulative_bytes),
-            "Packet Times": str(time_list),
             "Total Bytes": total_size,
             "Total Time": total_time,
             "Packet Min": packet_min,
@@ -46,9 +54,6 @@ def measure_packet_info(row, domain_col="Domain", file_col=None):
 
 df[
     [
-        "Packet Bytes",
-        "Cumulative Bytes",
-        "Packet Times",
         "Total Bytes",
         "Total Time",
         "Packet Min",
@@ -63,9 +68,6 @@ df.to_csv(OUTPUT_FILE, index=False)
 
 df_2[
     [
-        "Packet Bytes",
-        "Cumulative Bytes",
-        "Packet Times",
         "Total Bytes",
         "Total Time",
         "Packet Min",
@@ -1,22 +1,29 @@
+from itertools import accumulate
+
 import pandas as pd
-import ast
 import matplotlib.pyplot as plt
 
+from webclient.tracestore import TraceStore
+
 
 INPUT_FILE = "data/2_pkt/mirrors_packets.csv"
 INPUT_FILE_2 = "data/2_pkt/universities_packets.csv"
+TRACE_STORE_FILE = "data/2_pkt/packets.wct"
 
 df = pd.read_csv(INPUT_FILE)
 df_2 = pd.read_csv(INPUT_FILE_2)
+store = TraceStore(TRACE_STORE_FILE)
 
 
 plt.figure(figsize=(8, 4))
 grouped = df.groupby("Mirror")
 for mirror, group in grouped:
     for idx, row in group.iterrows():
-        packet_times = ast.literal_eval(row["Packet Times"])
-        cumulative_bytes = ast.literal_eval(row["Cumulative Bytes"])
-        plt.plot(packet_times, cumulative_bytes, marker="o", label=mirror)
+        # Only this trace is read from the store, straight from the mapped file
+        entry = store.find(host=mirror.strip(), path=row["File"].strip())[0]
+        trace = store.read(entry)
+        cumulative_bytes = list(accumulate(trace["sizes"]))
+        plt.plot(trace["times"], cumulative_bytes, marker="o", label=mirror)
 plt.xlabel("Packet Times (ms)")
 plt.ylabel("Cumulative Bytes")
 plt.legend()
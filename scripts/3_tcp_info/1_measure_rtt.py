@@ -1,5 +1,6 @@
 import pandas as pd
-import subprocess
+
+from webclient.batch import probe
 
 INPUT_CSV = "data/1_rtt/universities_with_rtt.csv"
 OUTPUT_CSV = "data/3_tcp_info/universities_with_tcp_info_rtt.csv"
@@ -12,18 +13,12 @@ for domain in df["Domain"]:
     rtt = None
     var = None
     try:
-        result = subprocess.run(
-            ["webclient", domain, "-info"],
-            capture_output=True,
-            text=True,
-            check=True,
-        )
-        output = result.stdout.strip().splitlines()
-        for line in output:
-            if line.startswith("TCP_INFO: RTT "):
-                rtt = float(line.split()[2])
-            elif line.startswith("TCP_INFO: RTT_var "):
-                var = float(line.split()[2])
+        record = probe(domain)
+        if record["error"]:
+            print(f"Error with {domain}: {record['error']}")
+        else:
+            rtt = record["tcp_info_rtt"]
+            var = record["tcp_info_rttvar"]
     except Exception as e:
         print(f"Error with {domain}: {e}")
     rtts.append({"rtt": rtt, "var": var})
@@ -1,21 +1,54 @@
+import json
+import os
 import re
-import time
-from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP
-import struct
+from itertools import chain
+from socket import getaddrinfo, AF_UNSPEC, SOCK_STREAM
+from time import perf_counter_ns
+
+from webclient.chunked import ChunkedDecoder, rechunk
+from webclient.eyeballs import CONNECTION_ATTEMPT_DELAY, connect_happy_eyeballs
+from webclient.encoding import ACCEPT_ENCODING, ContentDecoder
+from webclient.pool import ConnectionPool
+from webclient.response import Response
+from webclient.tcpinfo import read_tcp_info
+from webclient.trace import (
+    PacketTrace,
+    enable_kernel_timestamps,
+    queued_bytes,
+    recv_timestamped,
+)
+from webclient.timing import Timings
 
 
-# Basic HTTP GET request template
-HTTP_GET_TEMPLATE = (
-    "GET {path} HTTP/1.0\r\n"
+# Basic HTTP request template (extra headers are inserted before the blank line)
+HTTP_REQUEST_TEMPLATE = (
+    "{method} {path} {version}\r\n"
     "Host: {host}\r\n"
     "Accept: */*\r\n"
     "Accept-Language: en-US,en;q=0.9\r\n"
     "User-Agent: SimpleHTTPClient/0.1.0\r\n"
-    "Connection: close\r\n"
+    "Connection: {connection}\r\n"
+    "{headers}"
     "\r\n"
 )
 # Regex pattern to parse HTTP response status line (e.g., HTTP/1.1 200 OK)
 HTTP_RESPONSE_PATTERN = re.compile(r"HTTP/\d\.\d\s+(\d{3})\s+([^\r\n]+)\r\n")
+# Regex pattern to parse a header line (e.g., Content-Length: 1024)
+HTTP_HEADER_PATTERN = re.compile(r"([^:\r\n]+):[ \t]*([^\r\n]*)\r\n")
+# Marker separating the header block from the body
+HTTP_HEADER_END = b"\r\n\r\n"
+# Size of the reusable receive buffer
+RECV_BUFFER_SIZE = 10240  # 10K bytes
+# Number of packets shown at each end of the trace in verbose output
+VERBOSE_TRACE_EDGE = 10
+# Suffix of the file a resumable download is written to until it completes
+PARTIAL_SUFFIX = ".part"
+# Suffix of the sidecar file keeping the validator of a partial download
+PARTIAL_META_SUFFIX = ".part.json"
+# Regex pattern to parse a Content-Range header (e.g., bytes 100-199/1000 or bytes */1000)
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+# Empty chunk yielded by stream(yield_header=True) once the header block is parsed
+HEADER_RECEIVED = memoryview(b"")
 
 
 class HTTPWebClient:
@@ -29,44 +62,248 @@ class HTTPWebClient:
         packet=False,
         info=False,
         verbose=False,
+        timing=False,
+        buffer_size=RECV_BUFFER_SIZE,
+        keep_alive=False,
+        pool=None,
+        resolver=None,
+        tcp_info_every=None,
+        tcp_info_interval=None,
+        kernel_timestamps=False,
+        trace_capacity=None,
+        trace_histogram=False,
+        histograms=None,
+        method="GET",
+        headers=None,
+        resume=False,
+        cache=None,
+        compression=False,
+        family=AF_UNSPEC,
+        connect_attempt_delay=CONNECTION_ATTEMPT_DELAY,
+        profile=None,
+        tls=None,
+        hooks=None,
     ):
         self.host = host
         self.port = port
         self.path = path
         self.output_file = output_file
+        self.method = method
+        self.request_headers = dict(headers or {})
+        self.resume = resume
+        self.resumed_from = None
+        self.cache = cache
+        self.cache_status = None  # hit, revalidated or miss when a cache is used
+        self.compression = compression
+        self.family = family
+        self.connect_attempt_delay = connect_attempt_delay
+        self.connect_attempts = []
+        self.profile = profile
+        self.tls = tls
+        self.hooks = hooks  # webclient.hooks.Hooks called along the request
+        self.tls_version = None
+        self.tls_resumed = None  # Whether the handshake resumed a cached session
+        if tls and kernel_timestamps:
+            # recvmsg() would return the encrypted records
+            raise ValueError("Kernel receive timestamps are not available over TLS")
         self.status_code = None
         self.reason_phrase = None
+        self.http_version = None
+        self.headers = {}
         self.ping = ping
         self.ip_address = None
         self.rtt_ping = None
         self.packet = packet
-        self.packet_sizes = []
-        self.packet_times = []
+        self.kernel_timestamps = kernel_timestamps
+        self.trace_capacity = trace_capacity
+        self.trace_histogram = trace_histogram
+        self.trace = self._new_trace()
+        self.histograms = histograms
         self.info = info
         self.rtt = None
         self.rttvar = None
+        self.tcp_info = {}
+        self.tcp_info_samples = []
+        self.tcp_info_every = tcp_info_every
+        self.tcp_info_interval = tcp_info_interval
         self.verbose = verbose
+        self.timing = timing
+        self.timings = Timings()
+        self.buffer_size = buffer_size
+        if profile is not None and profile.buffer_size:
+            self.buffer_size = profile.buffer_size
+        # A pool only makes sense with persistent connections
+        self.keep_alive = keep_alive or pool is not None
+        self.pool = pool
+        self.reused_connection = False
+        self.resolver = resolver
+        self._leftover = memoryview(b"")  # Bytes received past the end of the response
+        self.pipelined = 0  # Responses of the last pipeline() batch received pipelined
 
         if not self.path.startswith("/"):
             self.path = "/" + self.path
 
-        self.base_url = f"http://{self.host}:{self.port}{self.path}"
+        # IPv6 literals are enclosed in brackets in URLs and Host headers
+        self.authority = f"[{self.host}]" if ":" in self.host else self.host
+        scheme = "https" if tls else "http"
+        self.base_url = f"{scheme}://{self.authority}:{self.port}{self.path}"
 
     def _receive_all(self, sock):
-        """Receive all data from the socket until closed and tracks packet sizes and times"""
-        response = b""
-        buffer_size = 10240  # 10K bytes
+        """Receive data from the socket until closed into a reusable buffer and track packet sizes and times
+
+        Yields memoryviews over the buffer, which are only valid until the next chunk is received.
+        With an adaptive socket profile, the receive size grows while data keeps arriving faster
+        than it is read.
+        """
+        profile = self.profile
+        adaptive = profile is not None and profile.adaptive_recv
+        quickack = profile is not None and profile.quickack
+        size = self.buffer_size
+        # Allocated once at the largest size, reads use the current size
+        buffer = bytearray(max(size, profile.max_buffer_size) if adaptive else size)
+        view = memoryview(buffer)
+        if self.kernel_timestamps:
+            clock_offset = enable_kernel_timestamps(sock)
+        chunk_sizes = self.histograms.get("chunk_size") if self.histograms else None
+        # Looked up once, events without callbacks cost a single check per chunk
+        on_first_byte = self.hooks.on_first_byte if self.hooks else None
+        on_chunk = self.hooks.on_chunk if self.hooks else None
         while True:
-            chunk = sock.recv(buffer_size)
-            read_time = time.time()
-            if not chunk:
+            if self.kernel_timestamps:
+                # Use the time the data reached the kernel, not when Python woke up
+                nbytes, arrival_time, queued = recv_timestamped(sock, view[:size])
+                read_time = perf_counter_ns()
+                if arrival_time is not None:
+                    read_time = arrival_time - clock_offset
+            else:
+                nbytes = sock.recv_into(buffer, size)
+                read_time = perf_counter_ns()
+                queued = 0
+            if not nbytes:
                 break
-            response += chunk
-            self.packet_sizes.append(len(chunk))
-            self.packet_times.append(read_time)
+            if self.timings.first_byte is None:
+                self.timings.mark("first_byte", read_time)
+                if on_first_byte:
+                    on_first_byte(self, read_time)
+            self.trace.append(nbytes, read_time, queued)
+            if chunk_sizes is not None:
+                chunk_sizes.record(nbytes)
+            if on_chunk:
+                on_chunk(self, nbytes, read_time)
+            self._sample_tcp_info(sock, read_time)
+            if quickack:
+                # The kernel leaves quick ACK mode on its own, set it again
+                profile.rearm(sock)
+            if adaptive:
+                waiting = queued
+                if nbytes >= size and not self.kernel_timestamps:
+                    # The read filled the buffer, check how much more is waiting
+                    waiting = queued_bytes(sock)
+                size = profile.next_recv_size(size, nbytes, waiting)
+            yield view[:nbytes]
+
+    def _feed_header(self, header, chunk):
+        """Append a chunk to the header buffer and, once the block is complete, parse it and return the leftover body bytes"""
+        header += chunk
+        # Only search the new bytes (plus a possibly split marker)
+        end = header.find(
+            HTTP_HEADER_END, max(0, len(header) - len(chunk) - len(HTTP_HEADER_END))
+        )
+        if end < 0:
+            return None
+        end += len(HTTP_HEADER_END)
+        # Header bytes are ISO-8859-1 by definition
+        header_text = header[:end].decode("iso-8859-1")
+        self.status_code, self.reason_phrase = self._parse_response(header_text)
+        self.http_version = header_text.split(" ", 1)[0]
+        self.headers = self._parse_headers(header_text)
+        self.timings.mark("header")
+        return memoryview(header)[end:]
+
+    def _read_header(self, chunks):
+        """Consume chunks until the header block is complete and return the leftover body bytes"""
+        header = bytearray()
+        for chunk in chunks:
+            leftover = self._feed_header(header, chunk)
+            if leftover is not None:
+                return leftover
+        # Connection closed before the header block was complete
+        return memoryview(b"")
+
+    def _parse_headers(self, header_text):
+        """Parse the header lines into a dict with lowercase names"""
+        headers = {}
+        status_end = header_text.find("\r\n") + 2
+        for match in HTTP_HEADER_PATTERN.finditer(header_text, status_end):
+            name = match.group(1).strip().lower()
+            if name in headers:
+                headers[name] += ", " + match.group(2)
+            else:
+                headers[name] = match.group(2)
+        return headers
+
+    def _keeps_alive(self):
+        """Check whether the server lets the connection be reused after this response"""
+        if not self.keep_alive:
+            return False
+        connection = self.headers.get("connection", "").lower()
+        if self.http_version == "HTTP/1.1":
+            return "close" not in connection
+        return "keep-alive" in connection
+
+    def _frame_body(self, chunks, leftover=b""):
+        """Yield the body delimited by its framing and return whether the connection can be reused
+
+        `leftover` holds the body bytes received with the header block. Bytes received past the
+        end of the body are kept in `_leftover`, they start the next response on the connection.
+        """
+        self._leftover = memoryview(b"")
+        if self.status_code is None:
+            return False
+        if (
+            self.method == "HEAD"
+            or 100 <= self.status_code < 200
+            or self.status_code in (204, 304)
+        ):
+            self._leftover = memoryview(leftover)
+            return self._keeps_alive()
+        if leftover:
+            chunks = chain([leftover], chunks)
+        if "chunked" in self.headers.get("transfer-encoding", "").lower():
+            complete = yield from self._decode_chunked(chunks)
+            return complete and self._keeps_alive()
+        if "content-length" in self.headers:
+            remaining = int(self.headers["content-length"])
+            for chunk in chunks if remaining else ():
+                if len(chunk) >= remaining:
+                    yield chunk[:remaining]
+                    self._leftover = chunk[remaining:]
+                    remaining = 0
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            return remaining == 0 and self._keeps_alive()
+        # Body delimited by the server closing the connection
+        yield from chunks
+        return False
 
-        # Ignore errors in decoding
-        return response.decode(errors="ignore")
+    def _decode_chunked(self, chunks):
+        """Yield the data of a chunked body and return whether the terminating chunk was read"""
+        decoder = ChunkedDecoder()
+        for chunk in chunks:
+            yield from decoder.feed(chunk)
+            if decoder.done:
+                self._leftover = decoder.leftover
+                return True
+        return False
+
+    @property
+    def validator(self):
+        """Validator of the response usable in If-Range: a strong ETag, else Last-Modified"""
+        etag = self.headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return self.headers.get("last-modified")
 
     def _parse_response(self, response):
         """Parse the HTTP response and return status code and reason phrase"""
@@ -78,87 +315,707 @@ class HTTPWebClient:
         return None, None
 
     def _get_tcp_info_rtt(self, sock):
-        """Query the Linux kernel for TCP statistics (RTT and RTT variance) using getsockopt(TCP_INFO)"""
-        # TCP_INFO
-        TCP_INFO = 11
+        """Query the Linux kernel for TCP statistics using getsockopt(TCP_INFO) and return RTT and RTT variance"""
+        self.tcp_info = read_tcp_info(sock)
 
-        # Request TCP info struct from the kernel
-        info = sock.getsockopt(IPPROTO_TCP, TCP_INFO, 104)
+        rtt_ms = self.tcp_info["rtt"] / 1000.0
+        rttvar_ms = self.tcp_info["rttvar"] / 1000.0
 
-        # Unpack the struct to get RTT and RTT variance
-        fmt = "B" * 7 + "I" * 24
-        tcp_info = struct.unpack(fmt, info)
-        rtt_micros, rttvar_micros = tcp_info[22], tcp_info[23]
+        return rtt_ms, rttvar_ms
 
-        rtt_ms = rtt_micros / 1000.0
-        rttvar_ms = rttvar_micros / 1000.0
+    def _sample_tcp_info(self, sock, read_time):
+        """Record TCP_INFO every `tcp_info_every` chunks or `tcp_info_interval` ms while receiving"""
+        if self.tcp_info_every:
+            due = (self.trace.count - 1) % self.tcp_info_every == 0
+        elif self.tcp_info_interval:
+            due = (
+                not self.tcp_info_samples
+                or self.trace.last_time - self.tcp_info_samples[-1]["time"]
+                >= self.tcp_info_interval
+            )
+        else:
+            return
+        if due:
+            sample = read_tcp_info(sock)
+            sample["time"] = self.trace.last_time
+            self.tcp_info_samples.append(sample)
+            if self.hooks and self.hooks.on_tcp_info:
+                self.hooks.on_tcp_info(self, sample, read_time)
 
-        return rtt_ms, rttvar_ms
+    def _new_trace(self):
+        """Create an empty packet trace with the configured storage mode"""
+        return PacketTrace(
+            capacity=self.trace_capacity,
+            histogram=self.trace_histogram,
+            queue_depth=self.kernel_timestamps,
+        )
+
+    @property
+    def packet_sizes(self):
+        return self.trace.sizes
+
+    @property
+    def packet_times(self):
+        return self.trace.times
+
+    @property
+    def packet_queued(self):
+        return self.trace.queued
+
+    def _start_trace(self):
+        """Reset the response state and measurements before a new request"""
+        self.trace = self._new_trace()
+        self.tcp_info = {}
+        self.tcp_info_samples = []
+        self.status_code = self.reason_phrase = self.http_version = None
+        self.headers = {}
+        self.timings = Timings()
+        self.timings.mark("start")
+
+    def _begin_trace(self, start_time):
+        """Start the packet trace at the connection start"""
+        self.trace.start = start_time
+        self.trace.append(0, start_time)
+
+    def _finish_trace(self, sock):
+        """Read the final TCP statistics and feed the latency histograms"""
+        self.rtt, self.rttvar = self._get_tcp_info_rtt(sock)
+        if self.hooks and self.hooks.on_tcp_info:
+            self.hooks.on_tcp_info(self, self.tcp_info, perf_counter_ns())
+        if self.histograms:
+            if not self.reused_connection and "connect" in self.histograms:
+                self.histograms["connect"].record(self.rtt_ping)
+            if self.tls_version and "tls" in self.histograms:
+                self.histograms["tls"].record(self.timings.phase("tls"))
+            for phase in ("ttfb", "total"):
+                if phase in self.histograms:
+                    self.histograms[phase].record(self.timings.phase(phase))
+
+    def _format_trace(self, values, fmt):
+        """Format trace values for verbose output, eliding the middle of long traces"""
+        if len(values) <= 2 * VERBOSE_TRACE_EDGE:
+            return " ".join(format(value, fmt) for value in values)
+        return (
+            " ".join(format(value, fmt) for value in values[:VERBOSE_TRACE_EDGE])
+            + f" ... ({len(values) - 2 * VERBOSE_TRACE_EDGE} more) ... "
+            + " ".join(format(value, fmt) for value in values[-VERBOSE_TRACE_EDGE:])
+        )
+
+    def _format_attempts(self):
+        """Format the connection attempts for verbose output"""
+        return ", ".join(
+            f"{attempt['address']} {attempt['result']}"
+            f" (at {attempt['start']:.2f} ms, {attempt['time']:.2f} ms)"
+            for attempt in self.connect_attempts
+        )
 
     def _log(self):
         if self.ping:
-            print(f"{self.ip_address} RTT {int(self.rtt_ping)} ms")
+            if self.rtt_ping is None:
+                # Served from the cache, no connection was made
+                print(f"{self.base_url} served from cache")
+            else:
+                print(f"{self.ip_address} RTT {int(self.rtt_ping)} ms")
         if self.packet:
-            for p_size, p_time in zip(self.packet_sizes, self.packet_times):
-                print(f"{p_size} bytes {int(p_time)} ms")
-        if self.info:
+            if self.trace_histogram:
+                for p_size, p_count in sorted(self.trace.size_counts.items()):
+                    print(f"{p_size} bytes x {p_count}")
+            elif self.kernel_timestamps:
+                # Queue depth left in the kernel after each read
+                for p_size, p_time, p_queued in zip(
+                    self.packet_sizes, self.packet_times, self.packet_queued
+                ):
+                    print(f"{p_size} bytes {p_time:.3f} ms {p_queued} queued")
+            else:
+                for p_size, p_time in zip(self.packet_sizes, self.packet_times):
+                    print(f"{p_size} bytes {int(p_time)} ms")
+        if self.info and self.rtt is not None:
             print(
                 f"TCP_INFO: RTT {int(self.rtt)} ms\n"
                 f"TCP_INFO: RTT_var {int(self.rttvar)} ms"
             )
+            for sample in self.tcp_info_samples:
+                print(
+                    f"TCP_INFO_SAMPLE: {sample['time']:.2f} ms"
+                    f" cwnd {sample['snd_cwnd']}"
+                    f" ssthresh {sample['snd_ssthresh']}"
+                    f" rtt {sample['rtt'] / 1000:.2f} ms"
+                    f" rcv_space {sample['rcv_space']}"
+                    f" bytes_received {sample.get('bytes_received')}"
+                    f" delivery_rate {sample.get('delivery_rate')}"
+                )
+        if self.timing:
+            for phase, duration in self.timings.as_dict().items():
+                if duration is not None:
+                    print(f"TIMING: {phase} {duration:.3f} ms")
         if self.verbose:
             print(
-                f"[LOG] HTTP GET Request\n"
+                f"[LOG] HTTP {self.method} Request\n"
                 f"[LOG]  URL                     : {self.base_url}\n"
                 f"[LOG]  IP Address              : {self.ip_address}\n"
+                f"[LOG]  HTTP Version            : {self.http_version}\n"
+                f"[LOG]  Reused Connection       : {self.reused_connection}\n"
+                f"[LOG]  Connect Attempts        : {self._format_attempts()}\n"
+                f"[LOG]  TLS                     : {self.tls_version}{' (resumed)' if self.tls_resumed else ''}\n"
                 f"[LOG]  Output File             : {self.output_file if self.output_file else 'None'}\n"
+                f"[LOG]  Cache                   : {self.cache_status}\n"
+                f"[LOG]  Resumed From            : {self.resumed_from if self.resumed_from is not None else 'None'}\n"
                 f"[LOG]  Status Code             : {self.status_code}\n"
                 f"[LOG]  Reason                  : {self.reason_phrase}\n"
-                f"[LOG]  RTT (-ping)             : {self.rtt_ping:.2f} ms\n"
-                f"[LOG]  RTT (TCP_INFO)          : {self.rtt:.2f} ms\n"
-                f"[LOG]  RTT Variance (TCP_INFO) : {self.rttvar:.2f} ms\n"
-                f"[LOG]  Response Size           : {sum(self.packet_sizes)} bytes\n"
-                f"[LOG]  Response Time           : {self.rtt_ping + sum(self.packet_times):.2f} ms\n"
-                f"[LOG]  Number of Packets       : {len(self.packet_sizes)}\n"
-                f"[LOG]  Packet Sizes (bytes)    : {' '.join(f'{size:8}' for size in self.packet_sizes)}\n"
-                f"[LOG]  Packet Times (ms)       : {' '.join(f'{t:8.2f}' for t in self.packet_times)}"
+                f"[LOG]  RTT (-ping)             : {self.rtt_ping or 0:.2f} ms\n"
+                f"[LOG]  RTT (TCP_INFO)          : {self.rtt or 0:.2f} ms\n"
+                f"[LOG]  RTT Variance (TCP_INFO) : {self.rttvar or 0:.2f} ms\n"
+                f"[LOG]  TCP_INFO                : {' '.join(f'{k}={v}' for k, v in self.tcp_info.items())}\n"
+                f"[LOG]  Response Size           : {self.trace.total_bytes} bytes\n"
+                f"[LOG]  Decoded Size            : {f'{self.trace.decoded_bytes} bytes' if self.trace.decoded_bytes is not None else 'None'}\n"
+                f"[LOG]  Response Time           : {self.timings.phase('total') or 0:.2f} ms\n"
+                f"[LOG]  Timings                 : {self.timings}\n"
+                f"[LOG]  Number of Packets       : {self.trace.count}\n"
+                f"[LOG]  Packet Sizes (bytes)    : {self._format_trace(self.packet_sizes, '8')}\n"
+                f"[LOG]  Packet Times (ms)       : {self._format_trace(self.packet_times, '8.2f')}"
             )
 
-    def get(self):
-        # Construct the HTTP GET request message
-        request_message = HTTP_GET_TEMPLATE.format(host=self.host, path=self.path)
+    def _connect(self):
+        """Resolve all server addresses and race connections to them (Happy Eyeballs), measuring RTT
+
+        With TLS, the handshake follows on the winning connection, timed as its own phase.
+        """
+        if self.resolver:
+            addresses = self.resolver.resolve(self.host, self.port, self.family)
+        else:
+            addresses = [
+                (family, sockaddr)
+                for family, _, _, _, sockaddr in getaddrinfo(
+                    self.host, self.port, self.family, SOCK_STREAM
+                )
+            ]
+        self.timings.mark("resolved")
+        if self.hooks and self.hooks.on_resolve:
+            self.hooks.on_resolve(self, addresses, self.timings.resolved)
+
+        self.connect_attempts = []
+        profile = self.profile
+        sock, _ = connect_happy_eyeballs(
+            addresses,
+            self.connect_attempt_delay,
+            self.connect_attempts,
+            timeout=profile.connect_timeout if profile else None,
+            setup=profile.setup if profile else None,
+        )
+        self.timings.mark("connected")
+        if self.hooks and self.hooks.on_connect:
+            self.hooks.on_connect(self, self.connect_attempts, self.timings.connected)
+        if profile:
+            profile.apply(sock)
+        if self.tls:
+            sock = self.tls.wrap(sock, self.host, self.port)
+            self.tls_version = sock.version()
+            self.tls_resumed = sock.session_reused
+            # Without TLS the mark stays unset, so there is no tls phase
+            self.timings.mark("secured")
+            if self.hooks and self.hooks.on_tls:
+                self.hooks.on_tls(
+                    self, self.tls_version, self.tls_resumed, self.timings.secured
+                )
+        # The RTT only covers the TCP handshake of the winning attempt
+        self.rtt_ping = next(
+            attempt["time"]
+            for attempt in self.connect_attempts
+            if attempt["result"] == "connected"
+        )
+        return sock
 
-        # Create a TCP socket
-        with socket(AF_INET, SOCK_STREAM) as sock:
-            # Connect to the server, measuring RTT
-            start_time = time.time()
-            sock.connect((self.host, self.port))
-            end_time = time.time()
-            self.rtt_ping = (end_time - start_time) * 1000
+    def _request_message(self):
+        """Construct the HTTP request message"""
+        request_headers = self.request_headers
+        if self.compression and not self.resume and "Range" not in request_headers:
+            # Ranges of an encoded body cannot be decoded on their own, and resumable
+            # downloads are checked and continued by their size as sent
+            request_headers = {"Accept-Encoding": ACCEPT_ENCODING, **request_headers}
+        return HTTP_REQUEST_TEMPLATE.format(
+            method=self.method,
+            host=self.authority,
+            path=self.path,
+            version="HTTP/1.1" if self.keep_alive else "HTTP/1.0",
+            connection="keep-alive" if self.keep_alive else "close",
+            headers="".join(
+                f"{name}: {value}\r\n" for name, value in request_headers.items()
+            ),
+        )
+
+    def _send_request(self, sock, request_message):
+        """Send the request and receive the header block, returning the chunk iterator and leftover bytes"""
+        sock.sendall(request_message)
+        self.timings.mark("sent")
+        if self.hooks and self.hooks.on_send:
+            self.hooks.on_send(self, len(request_message), self.timings.sent)
+        chunks = self._receive_all(sock)
+        return chunks, self._read_header(chunks)
+
+    def _fetch(self, yield_header=False):
+        """Send the HTTP request and yield the response body in chunks as they arrive"""
+        request_message = self._request_message().encode()
+        self._start_trace()
+
+        # Reuse an idle connection from the pool when possible
+        sock = self.pool.acquire(self.host, self.port) if self.pool else None
+        reusable = False
+        try:
+            self.reused_connection = sock is not None
+            if self.reused_connection:
+                self.timings.mark("resolved")
+                self.timings.mark("connected", self.timings.resolved)
+                if self.tls:
+                    self.timings.mark("secured", self.timings.resolved)
+                self.rtt_ping = 0.0
+            else:
+                sock = self._connect()
 
             # Get IP address
             self.ip_address = sock.getpeername()[0]
 
-            self.packet_sizes.append(0)
-            self.packet_times.append(start_time)
+            self._begin_trace(self.timings.resolved)
 
-            # Send the HTTP GET request
-            sock.sendall(request_message.encode())
+            # Send the HTTP request and wait for the header block
+            try:
+                chunks, leftover = self._send_request(sock, request_message)
+            except OSError:
+                if not self.reused_connection:
+                    raise
+            if self.status_code is None and self.reused_connection:
+                # The server closed the idle connection meanwhile, retry on a fresh one
+                sock.close()
+                self.reused_connection = False
+                sock = self._connect()
+                chunks, leftover = self._send_request(sock, request_message)
+            if yield_header:
+                yield HEADER_RECEIVED
 
-            # Receive the response
-            response = self._receive_all(sock)
+            # Receive the body, handing chunks to the caller without copying
+            reusable = yield from self._frame_body(chunks, leftover)
+            # Unexpected bytes after the response, the connection is out of sync
+            reusable = reusable and not self._leftover
+            self.timings.mark("body")
 
-            self.rtt, self.rttvar = self._get_tcp_info_rtt(sock)
-            self.packet_times = [
-                (t - self.packet_times[0]) * 1000 for t in self.packet_times[0:]
-            ]
+            self._finish_trace(sock)
+            if self.tls:
+                # TLS 1.3 session tickets arrive after the handshake, they are in by now
+                self.tls.store(self.host, self.port, sock)
+        finally:
+            if self.pool:
+                self.pool.release(self.host, self.port, sock, reusable)
+            elif sock is not None:
+                sock.close()
+
+    def _load_cached(self, entry):
+        """Set the response state from a cache entry"""
+        self.status_code = entry["status_code"]
+        self.reason_phrase = entry["reason_phrase"]
+        self.http_version = entry["http_version"]
+        self.headers = dict(entry["headers"])
+
+    def _cache_key(self):
+        """Key of the response in the cache: the URL, and the content codings the client accepts
+
+        Encoded bodies are stored as received, so they are only served to clients that sent the
+        same Accept-Encoding.
+        """
+        accept_encoding = next(
+            (
+                value
+                for name, value in self.request_headers.items()
+                if name.lower() == "accept-encoding"
+            ),
+            ACCEPT_ENCODING if self.compression else None,
+        )
+        if accept_encoding is None:
+            return self.base_url
+        return f"{self.base_url} Accept-Encoding: {accept_encoding}"
+
+    def _fetch_cached(self, yield_header=False):
+        """Yield the response body from the cache, revalidating or fetching it when stale"""
+        key = self._cache_key()
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            # Served from disk, no connection at all
+            self._start_trace()
+            self._load_cached(entry)
+            self.timings.mark("header")
+            self.cache_status = "hit"
+            if yield_header:
+                yield HEADER_RECEIVED
+            yield from self.cache.read_body(entry, self.buffer_size)
+            self.timings.mark("body")
+            return
 
-        # Parse the response status
-        self.status_code, self.reason_phrase = self._parse_response(response)
+        request_headers = self.request_headers
+        if entry is not None:
+            self.request_headers = {
+                **request_headers,
+                **self.cache.conditional_headers(entry),
+            }
+        self.cache_status = "miss"
+        body = None
+        try:
+            for chunk in self._fetch(yield_header):
+                if chunk is HEADER_RECEIVED:
+                    if self.status_code != 304 or entry is None:
+                        yield chunk
+                    # Otherwise the stored status line and headers are loaded first
+                    continue
+                if body is None and self.status_code == 200:
+                    body = self.cache.open_body(key)
+                if body is not None:
+                    body.write(chunk)
+                yield chunk
+        except BaseException:
+            if body is not None:
+                self.cache.discard(body)
+            raise
+        finally:
+            self.request_headers = request_headers
+
+        if self.status_code == 304 and entry is not None:
+            # Not modified: the stored body is still valid
+            entry = self.cache.refresh(entry, self.headers)
+            self._load_cached(entry)
+            self.cache_status = "revalidated"
+            if yield_header:
+                yield HEADER_RECEIVED
+            yield from self.cache.read_body(entry, self.buffer_size)
+            self.timings.mark("body")
+        elif self.status_code == 200:
+            if body is None:
+                body = self.cache.open_body(key)
+            length = self.headers.get("content-length")
+            if length is not None and body.tell() != int(length):
+                # Truncated body, do not keep it
+                self.cache.discard(body)
+            else:
+                self.cache.put(
+                    key,
+                    self.status_code,
+                    self.reason_phrase,
+                    self.http_version,
+                    self.headers,
+                    body,
+                )
+
+    def stream(self, yield_header=False):
+        """Send the HTTP request and yield the response body in chunks as they arrive
+
+        With a response cache, GET responses are served from it while fresh, revalidated with
+        the server when stale and stored otherwise. With `yield_header`, the empty
+        HEADER_RECEIVED chunk comes first, once the header block is parsed.
+        """
+        if (
+            self.cache is None
+            or self.method != "GET"
+            or "Range" in self.request_headers
+        ):
+            chunks = self._fetch(yield_header)
+        else:
+            chunks = self._fetch_cached(yield_header)
+        if self.hooks and self.hooks.on_complete:
+            chunks = self._report_complete(chunks)
+        if self.compression:
+            return self._decode_content(chunks)
+        return chunks
+
+    def _report_complete(self, chunks):
+        """Pass chunks through, calling the on_complete hook once the request ends or fails"""
+        error = None
+        try:
+            yield from chunks
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.hooks.on_complete(self, error, perf_counter_ns())
+
+    def iter_content(self, chunk_size=None):
+        """Send the HTTP request and yield the response body in pieces of `chunk_size` bytes
+
+        The last piece may be shorter. Without a chunk size, pieces are yielded as they arrive.
+        Pieces may be memoryviews that are only valid until the next one is yielded.
+        """
+        if chunk_size is None:
+            return self.stream()
+        return rechunk(self.stream(), chunk_size)
+
+    def _decode_content(self, chunks):
+        """Yield the body with its content encoding removed, counting the decoded bytes"""
+        decoder = None
+        for chunk in chunks:
+            if chunk is HEADER_RECEIVED:
+                yield chunk
+                continue
+            if decoder is None:
+                # The header block is parsed once the first chunk arrives
+                decoder = ContentDecoder(self.headers.get("content-encoding", ""))
+                self.trace.decoded_bytes = 0
+            if decoder:
+                chunk = decoder.decompress(chunk)
+            self.trace.decoded_bytes += len(chunk)
+            if chunk:
+                yield chunk
+        if decoder:
+            chunk = decoder.flush()
+            self.trace.decoded_bytes += len(chunk)
+            if chunk:
+                yield chunk
+        elif decoder is None:
+            self.trace.decoded_bytes = 0
+
+    def _partial_offset(self, partial_file, meta_file):
+        """Size of a partial download of this URL that can be resumed, with its validator"""
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            size = os.path.getsize(partial_file)
+        except (OSError, ValueError):
+            return 0, None
+        if meta.get("url") != self.base_url or not meta.get("validator"):
+            return 0, None
+        return size, meta["validator"]
+
+    def _open_partial(self, partial_file, meta_file, offset):
+        """Open the partial file once the response header is known, where the body goes"""
+        if self.status_code == 416 and offset:
+            # Keep the partial file until the range error is handled
+            return open(os.devnull, "wb")
+        match = CONTENT_RANGE_PATTERN.match(self.headers.get("content-range", ""))
+        if self.status_code == 206 and match and match.group(1) == str(offset):
+            # The server sends the missing bytes of the same version
+            self.resumed_from = offset
+            f = open(partial_file, "r+b")
+            f.seek(offset)
+            f.truncate()
+            return f
+        if self.status_code == 206:
+            raise OSError(
+                f"Unexpected Content-Range: {self.headers.get('content-range')}"
+            )
+
+        # Full response: the resource changed or ranges are not supported
+        self.resumed_from = None
+        if 200 <= self.status_code < 300 and self.validator:
+            with open(meta_file, "w") as meta:
+                json.dump({"url": self.base_url, "validator": self.validator}, meta)
+        elif os.path.exists(meta_file):
+            os.remove(meta_file)
+        return open(partial_file, "wb")
+
+    def _is_complete(self, size):
+        """Check whether a download of `size` bytes holds the whole resource"""
+        match = CONTENT_RANGE_PATTERN.match(self.headers.get("content-range", ""))
+        if self.status_code == 206 and match:
+            return match.group(3) == "*" or size == int(match.group(3))
+        if "content-length" in self.headers:
+            return size == int(self.headers["content-length"])
+        return True
+
+    def _download_resumable(self):
+        """Stream the body to a partial file and move it to the output file once complete
+
+        An earlier partial download of the same URL is continued with a Range request. If-Range
+        makes the server send the whole resource instead if it changed since.
+        """
+        partial_file = self.output_file + PARTIAL_SUFFIX
+        meta_file = self.output_file + PARTIAL_META_SUFFIX
+        offset, validator = self._partial_offset(partial_file, meta_file)
+        request_headers = self.request_headers
+        if offset:
+            self.request_headers = {
+                **request_headers,
+                "Range": f"bytes={offset}-",
+                "If-Range": validator,
+            }
+
+        f = None
+        try:
+            for chunk in self.stream():
+                if f is None:
+                    f = self._open_partial(partial_file, meta_file, offset)
+                f.write(chunk)
+            if f is None:
+                # Empty body
+                f = self._open_partial(partial_file, meta_file, offset)
+        finally:
+            self.request_headers = request_headers
+            if f is not None:
+                f.close()
+
+        if self.status_code == 416 and offset:
+            match = CONTENT_RANGE_PATTERN.match(self.headers.get("content-range", ""))
+            if not match or match.group(3) != str(offset):
+                # The partial file does not fit the resource, start over
+                os.remove(partial_file)
+                os.remove(meta_file)
+                return self._download_resumable()
+            # Nothing was missing, the partial file is already complete
+            self.resumed_from = offset
+        elif not self._is_complete(os.path.getsize(partial_file)):
+            raise OSError(f"Incomplete download kept in {partial_file}")
+        os.replace(partial_file, self.output_file)
+        if os.path.exists(meta_file):
+            os.remove(meta_file)
+
+    def _response(self, chunks=(), first_chunk=None, body=None):
+        """Response holding the current status line, headers and timings and the rest of the body"""
+        return Response(
+            self.base_url,
+            self.status_code,
+            self.reason_phrase,
+            self.http_version,
+            self.headers,
+            chunks,
+            first_chunk,
+            body,
+            self.timings,
+        )
+
+    def request(self):
+        """Send the HTTP request and return the Response once its header block has arrived
+
+        No body bytes are handed out yet, the body is left on the connection until read through
+        the Response, so the caller can check the status and headers first and close the
+        Response without downloading a body it does not need.
+        """
+        chunks = self.stream(yield_header=True)
+        next(chunks, None)
+        return self._response(chunks)
+
+    def _mark_first_byte(self, chunks):
+        """Pass chunks through, marking the first byte when the first one is received"""
+        for chunk in chunks:
+            if self.timings.first_byte is None:
+                self.timings.mark("first_byte")
+            yield chunk
+
+    def _pipelined_client(self, path):
+        """Client for one request of a pipelined batch, with the same target and request headers"""
+        return HTTPWebClient(
+            self.host,
+            self.port,
+            path,
+            buffer_size=self.buffer_size,
+            keep_alive=True,
+            resolver=self.resolver,
+            headers=self.request_headers,
+            family=self.family,
+            profile=self.profile,
+            tls=self.tls,
+            hooks=self.hooks,
+        )
+
+    def _pipeline(self, clients, responses):
+        """Send all requests at once on a new connection and append the responses as they complete"""
+        sock = self._connect()
+        try:
+            self.ip_address = sock.getpeername()[0]
+            self._begin_trace(self.timings.resolved)
+            request_messages = b"".join(
+                client._request_message().encode() for client in clients
+            )
+            sock.sendall(request_messages)
+            self.timings.mark("sent")
+            if self.hooks and self.hooks.on_send:
+                self.hooks.on_send(self, len(request_messages), self.timings.sent)
+
+            chunks = self._receive_all(sock)
+            pending = memoryview(b"")
+            for client in clients:
+                client._start_trace()
+                for mark in ("start", "resolved", "connected", "secured", "sent"):
+                    timestamp = getattr(self.timings, mark)
+                    # Unset marks (secured without TLS) stay unset, mark() would take now
+                    if timestamp is not None:
+                        client.timings.mark(mark, timestamp)
+                client.ip_address = self.ip_address
+                client.rtt_ping = self.rtt_ping
+                client.reused_connection = bool(responses)
+                stream = client._mark_first_byte(chunks)
+                if pending:
+                    # Bytes of this response arrived with the previous one
+                    client.timings.mark(
+                        "first_byte", self.trace.start + int(self.trace.last_time * 1e6)
+                    )
+                    stream = chain([pending], stream)
+
+                leftover = client._read_header(stream)
+                if client.status_code is None:
+                    # Connection closed, the rest is sent again one by one
+                    return
+                body = bytearray()
+                frames = client._frame_body(stream, leftover)
+                while True:
+                    try:
+                        body += next(frames)
+                    except StopIteration as stop:
+                        reusable = stop.value
+                        break
+                client.timings.mark("body")
+                if client.hooks and client.hooks.on_complete:
+                    client.hooks.on_complete(client, None, client.timings.body)
+                responses.append(client._response(body=body))
+                if not reusable:
+                    return
+                pending = client._leftover
+
+            self.timings.mark("body")
+            self._finish_trace(sock)
+            if self.tls:
+                self.tls.store(self.host, self.port, sock)
+        finally:
+            sock.close()
+
+    def pipeline(self, paths):
+        """Send GET requests for several paths at once on one connection and return their Responses
+
+        All requests are written with a single sendall (HTTP/1.1 pipelining) and the responses
+        are parsed in order from the stream, so the batch takes about one RTT instead of one per
+        request. Each Response has its own timings, measured from the start of the batch. If the
+        connection fails or the server closes it, the requests left unanswered are sent again
+        one by one on a persistent connection.
+        """
+        clients = [self._pipelined_client(path) for path in paths]
+        responses = []
+        self._start_trace()
+        try:
+            self._pipeline(clients, responses)
+        except (OSError, ValueError):
+            # Broken connection or garbled response, fall back to sequential requests
+            pass
+        self.pipelined = len(responses)
+
+        with ConnectionPool(max_per_host=1) as pool:
+            for client in clients[len(responses) :]:
+                client.pool = pool
+                response = client.request()
+                response.read()
+                responses.append(response)
+        return responses
+
+    def get(self):
+        """Send the HTTP request, save the body to the output file (if any) and return the Response
 
-        if self.output_file:
-            # Log the status code and reason phrase
-            with open(self.output_file, "w") as f:
-                f.write(response)
+        The body is not kept in memory, so reading it from the Response raises; use request()
+        to read it.
+        """
+        if self.output_file and self.resume:
+            self._download_resumable()
+        elif self.output_file:
+            # Stream the body straight to the output file, no decoding involved
+            with open(self.output_file, "wb") as f:
+                for chunk in self.stream():
+                    f.write(chunk)
+        else:
+            for _ in self.stream():
+                pass
 
         self._log()
+        response = self._response()
+        # The body is gone, reading it must fail rather than return nothing
+        response.consumed = True
+        return response
@@ -1,6 +1,37 @@
 import argparse
+import json
+import os
+import sys
+from socket import AF_INET, AF_INET6, AF_UNSPEC
 
 from webclient import HTTPWebClient
+from webclient.download import SegmentedDownload
+from webclient.bench import DEFAULT_CONNECTIONS, run_bench, run_bench_processes
+from webclient.cache import ResponseCache
+from webclient.chrometrace import ChromeTraceExporter
+from webclient.batch import (
+    RECORD_FORMATS,
+    read_targets,
+    run_batch,
+    store_traces,
+    write_records,
+)
+from webclient.hooks import Hooks
+from webclient.histogram import load_histograms, probe_histograms, save_histograms
+from webclient.monitor import (
+    DEFAULT_INTERVAL,
+    DEFAULT_JITTER,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_METRICS_PORT,
+    DEFAULT_WINDOW,
+    DEFAULT_WORKERS,
+    Monitor,
+    serve_metrics,
+)
+from webclient.resolver import DEFAULT_DNS_TTL, Resolver
+from webclient.tls import TLSSessionCache
+from webclient.tracestore import TraceStore
+from webclient.tuning import SOCKET_PROFILES
 
 DEFAULT_HOST = "www.example.com"
 DEFAULT_PORT = 80
@@ -9,8 +40,7 @@ DEFAULT_PATH = "/"
 DEFAULT_OUTPUT_FILE = "./webout"
 
 
-def main():
-    parser = argparse.ArgumentParser(description="")
+def add_target_arguments(parser):
     parser.add_argument(
         "host",
         nargs="?",
@@ -30,6 +60,266 @@ def main():
         default=DEFAULT_PATH,
         help="Path to request from the server (default: %(default)s)",
     )
+
+
+def add_socket_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        choices=SOCKET_PROFILES,
+        default="default",
+        help="Socket options and receive buffer sizing (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--buffer-size",
+        type=int,
+        metavar="BYTES",
+        help="Initial receive size, overriding the profile (default: 10240)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Give up connecting after this many seconds, overriding the profile",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Give up waiting for data after this many seconds, overriding the profile",
+    )
+
+
+def add_tls_arguments(parser):
+    parser.add_argument(
+        "-s",
+        "--tls",
+        action="store_true",
+        help="Connect with TLS (HTTPS)",
+    )
+    parser.add_argument(
+        "-k",
+        "--insecure",
+        action="store_true",
+        help="Do not verify the server certificate",
+    )
+    parser.add_argument(
+        "--cafile",
+        metavar="FILE",
+        help="Verify the server certificate against the CAs in this PEM file",
+    )
+    parser.add_argument(
+        "--no-tls-resume",
+        action="store_true",
+        help="Always perform a full TLS handshake instead of resuming sessions",
+    )
+
+
+def tls_sessions(args):
+    """TLS session cache selected by the arguments of add_tls_arguments(), or None without TLS"""
+    if not args.tls:
+        return None
+    return TLSSessionCache(
+        verify=not args.insecure, cafile=args.cafile, resume=not args.no_tls_resume
+    )
+
+
+def add_trace_arguments(parser):
+    parser.add_argument(
+        "--chrome-trace",
+        metavar="FILE",
+        help="Write the timeline of every request as a Chrome trace (open it in Perfetto)",
+    )
+
+
+def chrome_trace(args):
+    """Exporter and hooks selected by the arguments of add_trace_arguments(), or None twice"""
+    if not args.chrome_trace:
+        return None, None
+    exporter = ChromeTraceExporter()
+    return exporter, Hooks(exporter)
+
+
+def socket_profile(args):
+    """Socket profile selected by the arguments of add_socket_arguments()"""
+    changes = {
+        name: getattr(args, name)
+        for name in ("buffer_size", "connect_timeout", "read_timeout")
+        if getattr(args, name) is not None
+    }
+    return SOCKET_PROFILES[args.profile].replace(**changes)
+
+
+def bench_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="webclient bench", description="Benchmark an HTTP server"
+    )
+    add_target_arguments(parser)
+    parser.add_argument(
+        "-c",
+        "--connections",
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help="Number of concurrent connections (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        help="Run for this many seconds (default: 10 unless -n is given)",
+    )
+    parser.add_argument(
+        "-n",
+        "--requests",
+        type=int,
+        help="Stop after this many requests",
+    )
+    parser.add_argument(
+        "-ka",
+        "--keep-alive",
+        action="store_true",
+        help="Reuse connections with HTTP/1.1 keep-alive",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="Target request rate in requests per second (open loop)",
+    )
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of worker processes sharing the connections (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the result as JSON",
+    )
+    add_socket_arguments(parser)
+    add_tls_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.chrome_trace and args.processes > 1:
+        parser.error("--chrome-trace cannot be used with worker processes")
+    exporter, hooks = chrome_trace(args)
+
+    options = dict(
+        profile=socket_profile(args),
+        tls=tls_sessions(args),
+        hooks=hooks,
+        connections=args.connections,
+        duration=args.duration,
+        requests=args.requests,
+        keep_alive=args.keep_alive,
+        rate=args.rate,
+    )
+    if args.processes > 1:
+        result = run_bench_processes(
+            args.host, args.port, args.path, args.processes, **options
+        )
+    else:
+        result = run_bench(args.host, args.port, args.path, **options)
+    print(json.dumps(result.summary()) if args.json else result.report())
+    if exporter:
+        exporter.save(args.chrome_trace)
+
+
+def monitor_main(argv):
+    parser = argparse.ArgumentParser(
+        prog="webclient monitor",
+        description="Probe targets continuously and serve their metrics for Prometheus",
+    )
+    parser.add_argument(
+        "targets",
+        help="CSV/JSONL file of targets (host, port, path and optional interval columns)",
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between probes of targets without an interval (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=DEFAULT_JITTER,
+        help="Fraction of the interval probes are moved at random (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of probes running at the same time (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=DEFAULT_WINDOW,
+        help="Seconds of probes summarized by the quantiles (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-l",
+        "--listen",
+        default=f"{DEFAULT_METRICS_HOST}:{DEFAULT_METRICS_PORT}",
+        metavar="HOST:PORT",
+        help="Address of the /metrics endpoint (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        help="Stop after this many seconds (default: run until interrupted)",
+    )
+    parser.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=DEFAULT_DNS_TTL,
+        help="Seconds a resolved name is cached (default: %(default)s)",
+    )
+    add_socket_arguments(parser)
+    add_tls_arguments(parser)
+    args = parser.parse_args(argv)
+
+    monitor = Monitor(
+        read_targets(args.targets, intervals=True),
+        interval=args.interval,
+        jitter=args.jitter,
+        workers=args.workers,
+        window=args.window,
+        resolver=Resolver(ttl=args.dns_ttl),
+        profile=socket_profile(args),
+        tls=tls_sessions(args),
+    )
+    host, _, port = args.listen.rpartition(":")
+    server = serve_metrics(monitor, host or DEFAULT_METRICS_HOST, int(port))
+    print(
+        f"Probing {len(monitor.targets)} targets, "
+        f"metrics on http://{args.listen}/metrics",
+        file=sys.stderr,
+    )
+    try:
+        monitor.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+def main():
+    if sys.argv[1:2] == ["bench"]:
+        return bench_main(sys.argv[2:])
+    if sys.argv[1:2] == ["monitor"]:
+        return monitor_main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(
+        description="",
+        epilog="Run 'webclient bench -h' for the benchmark mode and "
+        "'webclient monitor -h' for the monitoring mode.",
+    )
+    add_target_arguments(parser)
     parser.add_argument(
         "-f",
         "--file",
@@ -54,19 +344,227 @@ def main():
         action="store_true",
         help="Measure the packet size of the response",
     )
+    parser.add_argument(
+        "-kts",
+        "--kernel-timestamps",
+        action="store_true",
+        help="Use kernel receive timestamps and report the queue depth in the packet trace",
+    )
+    parser.add_argument(
+        "--trace-capacity",
+        type=int,
+        metavar="N",
+        help="Keep only the last N packets of the trace",
+    )
+    parser.add_argument(
+        "--trace-histogram",
+        action="store_true",
+        help="Only count packets per size instead of keeping the trace",
+    )
+    parser.add_argument(
+        "--trace-store",
+        metavar="FILE",
+        help="Append packet traces to a binary columnar trace store instead of the batch records",
+    )
     parser.add_argument(
         "-info",
         "--info",
         action="store_true",
         help="Display TCP connection information using TCP_INFO",
     )
+    parser.add_argument(
+        "--info-every",
+        type=int,
+        metavar="K",
+        help="Sample TCP_INFO every K received chunks",
+    )
+    parser.add_argument(
+        "--info-interval",
+        type=float,
+        metavar="MS",
+        help="Sample TCP_INFO every MS milliseconds while receiving",
+    )
+    family = parser.add_mutually_exclusive_group()
+    family.add_argument(
+        "-4",
+        "--ipv4",
+        action="store_const",
+        dest="family",
+        const=AF_INET,
+        default=AF_UNSPEC,
+        help="Only connect over IPv4 (default: race IPv6 and IPv4 addresses)",
+    )
+    family.add_argument(
+        "-6",
+        "--ipv6",
+        action="store_const",
+        dest="family",
+        const=AF_INET6,
+        help="Only connect over IPv6",
+    )
+    parser.add_argument(
+        "-t",
+        "--timings",
+        action="store_true",
+        help="Display the time spent in each phase of the request",
+    )
+    parser.add_argument(
+        "-ka",
+        "--keep-alive",
+        action="store_true",
+        help="Use HTTP/1.1 with a persistent connection",
+    )
+    parser.add_argument(
+        "-z",
+        "--compressed",
+        action="store_true",
+        help="Request a gzip/deflate encoded response and decode it",
+    )
+    parser.add_argument(
+        "-rs",
+        "--resume",
+        action="store_true",
+        help="Download to a partial file and resume it on the next run with a Range request",
+    )
+    parser.add_argument(
+        "-pl",
+        "--pipeline",
+        nargs="+",
+        metavar="PATH",
+        help="Also request these paths, pipelined on the same connection, and show per-response timings",
+    )
+    parser.add_argument(
+        "-seg",
+        "--segments",
+        type=int,
+        default=1,
+        metavar="K",
+        help="Download the file as K parallel byte ranges (default: %(default)s)",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
         action="store_true",
         help="Enable verbose output",
     )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        metavar="TARGETS",
+        help="Probe every host/port/path in a CSV or JSONL targets file and write measurement records",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=1,
+        help="Number of probes per target in batch mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of worker processes sharing the batch targets (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Output file for batch records (default: stdout)",
+    )
+    parser.add_argument(
+        "--histograms",
+        metavar="FILE",
+        help="Accumulate connect/TTFB/total/chunk size histograms of batch probes in a JSON file",
+    )
+    parser.add_argument(
+        "--format",
+        choices=RECORD_FORMATS,
+        help="Format of batch records (default: from output file extension, else jsonl)",
+    )
+    parser.add_argument(
+        "--dns-cache",
+        metavar="FILE",
+        help="Cache resolved names in a file across runs",
+    )
+    parser.add_argument(
+        "--dns-ttl",
+        type=float,
+        default=DEFAULT_DNS_TTL,
+        help="Seconds a resolved name is cached (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="Cache responses in a directory and revalidate them instead of downloading again",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        metavar="N",
+        help="Keep at most N cached responses, evicting the least recently used",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        type=int,
+        metavar="BYTES",
+        help="Keep at most BYTES of cached bodies, evicting the least recently used",
+    )
+    add_socket_arguments(parser)
+    add_tls_arguments(parser)
+    add_trace_arguments(parser)
     args = parser.parse_args()
+    if args.tls and args.kernel_timestamps:
+        parser.error("--kernel-timestamps cannot be used with --tls")
+    if args.chrome_trace and args.batch and args.processes > 1:
+        parser.error("--chrome-trace cannot be used with worker processes")
+    exporter, hooks = chrome_trace(args)
+    profile = socket_profile(args)
+    tls = tls_sessions(args)
+    resolver = Resolver(ttl=args.dns_ttl, cache_file=args.dns_cache)
+    cache = None
+    if args.cache:
+        cache = ResponseCache(
+            args.cache,
+            max_entries=args.cache_max_entries,
+            max_bytes=args.cache_max_size,
+        )
+
+    if args.batch:
+        histograms = None
+        if args.histograms:
+            histograms = probe_histograms()
+            if os.path.exists(args.histograms):
+                # Merge with the histograms of previous runs
+                for name, histogram in load_histograms(args.histograms).items():
+                    histograms[name].merge(histogram)
+        records = run_batch(
+            read_targets(args.batch),
+            repeat=args.repeat,
+            resolver=resolver,
+            processes=args.processes,
+            histograms=histograms,
+            keep_alive=args.keep_alive,
+            kernel_timestamps=args.kernel_timestamps,
+            trace_capacity=args.trace_capacity,
+            trace_histogram=args.trace_histogram,
+            tcp_info_every=args.info_every,
+            tcp_info_interval=args.info_interval,
+            cache=cache,
+            compression=args.compressed,
+            family=args.family,
+            profile=profile,
+            tls=tls,
+            hooks=hooks,
+        )
+        if args.trace_store:
+            records = store_traces(records, TraceStore(args.trace_store))
+        write_records(records, args.output, args.format)
+        if histograms:
+            save_histograms(histograms, args.histograms)
+        if exporter:
+            exporter.save(args.chrome_trace)
+        return
 
     server_host = args.host
     server_port = args.port
@@ -78,9 +576,62 @@ def main():
     if packet:
         no_file = True
     info = args.info
+    timing = args.timings
+    keep_alive = args.keep_alive
 
     verbose = args.verbose
 
+    if args.segments > 1 and not no_file:
+        download = SegmentedDownload(
+            server_host,
+            server_port,
+            server_path,
+            output_file,
+            segments=args.segments,
+            ping=ping,
+            info=info,
+            verbose=verbose,
+            timing=timing,
+            resolver=resolver,
+            family=args.family,
+            profile=profile,
+            tls=tls,
+            hooks=hooks,
+        )
+        for client in download.run():
+            client._log()
+        print(
+            f"Downloaded {download.size} bytes in {download.elapsed:.3f} s "
+            f"over {len(download.clients)} connections ({sum(download.attempts)} requests)"
+        )
+        if exporter:
+            exporter.save(args.chrome_trace)
+        return
+
+    if args.pipeline:
+        client = HTTPWebClient(
+            server_host,
+            server_port,
+            server_path,
+            resolver=resolver,
+            family=args.family,
+            profile=profile,
+            tls=tls,
+            hooks=hooks,
+        )
+        paths = [client.path, *args.pipeline]
+        responses = client.pipeline(paths)
+        for path, response in zip(paths, responses):
+            print(
+                f"PIPELINE: {path} {response.status_code} {len(response.read())} bytes"
+                f" ttfb {response.timings.phase('ttfb') or 0:.3f} ms"
+                f" total {response.timings.phase('total') or 0:.3f} ms"
+            )
+        print(f"PIPELINE: {client.pipelined} of {len(paths)} responses pipelined")
+        if exporter:
+            exporter.save(args.chrome_trace)
+        return
+
     client = HTTPWebClient(
         host=server_host,
         port=server_port,
@@ -90,8 +641,36 @@ def main():
         packet=packet,
         info=info,
         verbose=verbose,
+        timing=timing,
+        keep_alive=keep_alive,
+        resolver=resolver,
+        kernel_timestamps=args.kernel_timestamps,
+        trace_capacity=args.trace_capacity,
+        trace_histogram=args.trace_histogram,
+        tcp_info_every=args.info_every,
+        tcp_info_interval=args.info_interval,
+        resume=args.resume,
+        cache=cache,
+        compression=args.compressed,
+        family=args.family,
+        profile=profile,
+        tls=tls,
+        hooks=hooks,
     )
     client.get()
+    if args.trace_store:
+        store = TraceStore(args.trace_store)
+        store.append_trace(
+            client.trace,
+            host=client.host,
+            port=client.port,
+            path=client.path,
+            # Each invocation is the next run of the target
+            run=store.next_run(host=client.host, port=client.port, path=client.path),
+            ip=client.ip_address,
+        )
+    if exporter:
+        exporter.save(args.chrome_trace)
 
 
 if __name__ == "__main__":
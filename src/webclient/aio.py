@@ -0,0 +1,208 @@
+import asyncio
+from socket import socket, SOCK_STREAM, IPPROTO_TCP
+from time import perf_counter_ns
+
+from webclient import HTTPWebClient
+from webclient.eyeballs import family_name, sort_addresses
+
+# Default number of targets fetched at the same time by fetch_many()
+DEFAULT_CONCURRENCY = 50
+# Options of HTTPWebClient the asyncio client does not support
+ASYNC_UNSUPPORTED_OPTIONS = (
+    "keep_alive",
+    "pool",
+    "kernel_timestamps",
+    "resume",
+    "cache",
+    "compression",
+    "profile",
+    "tls",
+)
+
+
+class AsyncHTTPWebClient(HTTPWebClient):
+    """asyncio counterpart of HTTPWebClient with the same measurements
+
+    Requests are sent as HTTP/1.0 with Connection: close, so the body ends when the server
+    closes the connection. Addresses are tried one after the other instead of racing them.
+    Kernel receive timestamps, resumable downloads, the response cache, content decoding,
+    socket profiles and TLS are not supported, and enabling them raises ValueError.
+    """
+
+    def __init__(self, host, port, path, **kwargs):
+        unsupported = [name for name in ASYNC_UNSUPPORTED_OPTIONS if kwargs.get(name)]
+        if unsupported:
+            raise ValueError(
+                f"Not supported by the asyncio client: {', '.join(unsupported)}"
+            )
+        super().__init__(host, port, path, **kwargs)
+
+    async def _receive_all(self, sock):
+        """Receive data from the socket until closed into a reusable buffer and track packet sizes and times"""
+        loop = asyncio.get_running_loop()
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        chunk_sizes = self.histograms.get("chunk_size") if self.histograms else None
+        on_first_byte = self.hooks.on_first_byte if self.hooks else None
+        on_chunk = self.hooks.on_chunk if self.hooks else None
+        while True:
+            nbytes = await loop.sock_recv_into(sock, buffer)
+            read_time = perf_counter_ns()
+            if not nbytes:
+                break
+            if self.timings.first_byte is None:
+                self.timings.mark("first_byte", read_time)
+                if on_first_byte:
+                    on_first_byte(self, read_time)
+            self.trace.append(nbytes, read_time)
+            if chunk_sizes is not None:
+                chunk_sizes.record(nbytes)
+            if on_chunk:
+                on_chunk(self, nbytes, read_time)
+            self._sample_tcp_info(sock, read_time)
+            yield view[:nbytes]
+
+    async def _connect_any(self, addresses):
+        """Connect to the first address that accepts, alternating families, measuring RTT"""
+        loop = asyncio.get_running_loop()
+        self.connect_attempts = []
+        error = None
+        for family, address in sort_addresses(addresses):
+            start = perf_counter_ns()
+            attempt = {
+                "family": family_name(family),
+                "address": address[0],
+                "start": (start - self.timings.resolved) / 1e6,
+                "time": None,
+                "result": None,
+            }
+            self.connect_attempts.append(attempt)
+            sock = socket(family, SOCK_STREAM, IPPROTO_TCP)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, address)
+            except OSError as e:
+                attempt["time"] = (perf_counter_ns() - start) / 1e6
+                attempt["result"] = e.strerror or str(e)
+                error = e
+                sock.close()
+                continue
+            except BaseException:
+                # Cancelled (e.g., by a fetch_many() timeout) while connecting
+                sock.close()
+                raise
+            attempt["time"] = self.rtt_ping = (perf_counter_ns() - start) / 1e6
+            attempt["result"] = "connected"
+            return sock
+        raise error or OSError(f"No address found for {self.host}")
+
+    async def _fetch(self):
+        """Send the HTTP request and yield the response body in chunks as they arrive"""
+        loop = asyncio.get_running_loop()
+        request_message = self._request_message().encode()
+        self._start_trace()
+
+        # Resolve first so the RTT only covers the TCP handshake
+        if self.resolver:
+            addresses = await loop.run_in_executor(
+                None, self.resolver.resolve, self.host, self.port, self.family
+            )
+        else:
+            addresses = [
+                (family, sockaddr)
+                for family, _, _, _, sockaddr in await loop.getaddrinfo(
+                    self.host, self.port, family=self.family, type=SOCK_STREAM
+                )
+            ]
+        self.timings.mark("resolved")
+        if self.hooks and self.hooks.on_resolve:
+            self.hooks.on_resolve(self, addresses, self.timings.resolved)
+
+        with await self._connect_any(addresses) as sock:
+            self.timings.mark("connected")
+            if self.hooks and self.hooks.on_connect:
+                self.hooks.on_connect(
+                    self, self.connect_attempts, self.timings.connected
+                )
+
+            # Get IP address
+            self.ip_address = sock.getpeername()[0]
+
+            self._begin_trace(self.timings.resolved)
+
+            # Send the HTTP GET request
+            await loop.sock_sendall(sock, request_message)
+            self.timings.mark("sent")
+            if self.hooks and self.hooks.on_send:
+                self.hooks.on_send(self, len(request_message), self.timings.sent)
+
+            # Receive the response, handing body chunks to the caller without copying
+            header = bytearray()
+            async for chunk in self._receive_all(sock):
+                if header is None:
+                    yield chunk
+                    continue
+                leftover = self._feed_header(header, chunk)
+                if leftover is None:
+                    continue
+                header = None
+                if leftover:
+                    yield leftover
+            self.timings.mark("body")
+
+            self._finish_trace(sock)
+
+    def stream(self):
+        """Send the HTTP request and asynchronously yield the response body in chunks as they arrive"""
+        chunks = self._fetch()
+        if self.hooks and self.hooks.on_complete:
+            return self._report_complete(chunks)
+        return chunks
+
+    async def _report_complete(self, chunks):
+        """Pass chunks through, calling the on_complete hook once the request ends or fails"""
+        error = None
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.hooks.on_complete(self, error, perf_counter_ns())
+
+    async def get(self):
+        if self.output_file:
+            with open(self.output_file, "wb") as f:
+                async for chunk in self.stream():
+                    f.write(chunk)
+        else:
+            async for _ in self.stream():
+                pass
+
+        self._log()
+        response = self._response()
+        # The body is gone, reading it must fail rather than return nothing
+        response.consumed = True
+        return response
+
+
+async def fetch_many(targets, concurrency=DEFAULT_CONCURRENCY, timeout=None, **kwargs):
+    """Fetch (host, port, path) targets concurrently and return their clients in the same order
+
+    At most `concurrency` targets are in flight at once and each one is given `timeout` seconds.
+    A target that fails is returned as its exception instead of a client. Extra keyword arguments
+    are passed to AsyncHTTPWebClient.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(host, port, path):
+        client = AsyncHTTPWebClient(host, port, path, **kwargs)
+        async with semaphore:
+            await asyncio.wait_for(client.get(), timeout)
+        return client
+
+    return await asyncio.gather(
+        *(fetch(host, port, path) for host, port, path in targets),
+        return_exceptions=True,
+    )
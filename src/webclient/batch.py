@@ -0,0 +1,236 @@
+import csv
+import json
+import os
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from webclient import HTTPWebClient
+from webclient.histogram import probe_histograms
+from webclient.resolver import Resolver
+
+# Column names accepted for each target field (case insensitive)
+TARGET_HOST_COLUMNS = ("host", "domain", "mirror")
+TARGET_PORT_COLUMNS = ("port",)
+TARGET_PATH_COLUMNS = ("path", "file")
+TARGET_INTERVAL_COLUMNS = ("interval",)
+TARGET_DEFAULT_PORT = 80
+TARGET_DEFAULT_PATH = "/"
+
+# Fields of a measurement record, in output order
+RECORD_FIELDS = [
+    "host",
+    "port",
+    "path",
+    "run",
+    "ip",
+    "status_code",
+    "rtt_ping",
+    "connect_attempts",
+    "tls_version",
+    "tls_resumed",
+    "tcp_info_rtt",
+    "tcp_info_rttvar",
+    "tcp_info",
+    "tcp_info_samples",
+    "response_size",
+    "decoded_size",
+    "packet_count",
+    "packet_sizes",
+    "packet_times",
+    "packet_queued",
+    "packet_histogram",
+    "timings",
+    "cache_status",
+    "error",
+]
+RECORD_FORMATS = ("jsonl", "csv")
+
+
+def _lookup(row, columns, default):
+    """Get the first non-empty value of the given columns from a row"""
+    for column in columns:
+        value = row.get(column)
+        if value not in (None, ""):
+            return str(value).strip()
+    return default
+
+
+def read_targets(targets_file, intervals=False):
+    """Read (host, port, path) targets from a CSV file with a header or a JSONL file
+
+    With `intervals`, targets are (host, port, path, interval) with the probe interval in
+    seconds of the target, or None when it has none.
+    """
+    with open(targets_file, newline="") as f:
+        if targets_file.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    targets = []
+    for row in rows:
+        row = {str(key).strip().lower(): value for key, value in row.items()}
+        host = _lookup(row, TARGET_HOST_COLUMNS, None)
+        if host is None:
+            raise ValueError(f"Target without host in {targets_file}: {row}")
+        port = int(_lookup(row, TARGET_PORT_COLUMNS, TARGET_DEFAULT_PORT))
+        path = _lookup(row, TARGET_PATH_COLUMNS, TARGET_DEFAULT_PATH)
+        if intervals:
+            interval = _lookup(row, TARGET_INTERVAL_COLUMNS, None)
+            interval = float(interval) if interval is not None else None
+            targets.append((host, port, path, interval))
+        else:
+            targets.append((host, port, path))
+    return targets
+
+
+def probe(host, port=TARGET_DEFAULT_PORT, path=TARGET_DEFAULT_PATH, run=0, **kwargs):
+    """Fetch a target once and return its measurements as a record"""
+    client = HTTPWebClient(host, port, path, **kwargs)
+    record = dict.fromkeys(RECORD_FIELDS)
+    record.update(host=host, port=port, path=client.path, run=run)
+    try:
+        client.get()
+    except (OSError, ValueError, zlib.error) as e:
+        # Network failures and malformed responses only end this probe
+        record["error"] = f"{type(e).__name__}: {e}"
+        # Keep the attempts that failed or timed out
+        record["connect_attempts"] = client.connect_attempts or None
+        return record
+
+    record.update(
+        ip=client.ip_address,
+        status_code=client.status_code,
+        rtt_ping=client.rtt_ping,
+        connect_attempts=client.connect_attempts or None,
+        tls_version=client.tls_version,
+        tls_resumed=client.tls_resumed,
+        tcp_info_rtt=client.rtt,
+        tcp_info_rttvar=client.rttvar,
+        tcp_info=client.tcp_info,
+        tcp_info_samples=client.tcp_info_samples,
+        response_size=client.trace.total_bytes,
+        decoded_size=client.trace.decoded_bytes,
+        packet_count=client.trace.count,
+        packet_sizes=list(client.packet_sizes),
+        packet_times=list(client.packet_times),
+        packet_queued=list(client.packet_queued),
+        packet_histogram=client.trace.size_counts or None,
+        timings=client.timings.as_dict(),
+        cache_status=client.cache_status,
+    )
+    return record
+
+
+def _run_shard(targets, repeat, resolver, histograms, kwargs):
+    """Probe a share of the targets in a worker process and return the records and histograms"""
+    records = list(
+        run_batch(targets, repeat, resolver, histograms=histograms, **kwargs)
+    )
+    return records, histograms
+
+
+def run_batch(targets, repeat=1, resolver=None, processes=1, histograms=None, **kwargs):
+    """Probe every target `repeat` times in this process and yield the records
+
+    All hosts are resolved in parallel beforehand, so repeated probes skip the lookup. With more
+    than one process, targets are sharded over worker processes and records are yielded per
+    shard as the shards finish. Histograms (see webclient.histogram.probe_histograms) are fed
+    by every probe, merging the ones of the worker processes.
+    """
+    targets = list(targets)
+    if resolver is None:
+        resolver = Resolver()
+    resolver.prefetch(host for host, _, _ in targets)
+
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [
+                executor.submit(
+                    _run_shard,
+                    targets[index::processes],
+                    repeat,
+                    resolver,
+                    # Fresh histograms, so only the probes of the shard are merged back
+                    probe_histograms() if histograms is not None else None,
+                    kwargs,
+                )
+                for index in range(processes)
+            ]
+            for future in as_completed(futures):
+                records, shard_histograms = future.result()
+                for name, histogram in (shard_histograms or {}).items():
+                    histograms[name].merge(histogram)
+                yield from records
+        return
+
+    for host, port, path in targets:
+        for run in range(repeat):
+            yield probe(
+                host,
+                port,
+                path,
+                run=run,
+                resolver=resolver,
+                histograms=histograms,
+                **kwargs,
+            )
+
+
+def store_traces(records, store):
+    """Append the packet trace of each record to a TraceStore, removing it from the record
+
+    The trace is indexed by the host, port, path and run of the record. Runs continue after the
+    traces of the target already in the store, and the run of the record is updated to match.
+    """
+    first_runs = {}  # (host, port, path) -> run the records of this batch start at
+    for record in records:
+        if record["packet_sizes"] is not None:
+            target = (record["host"], record["port"], record["path"])
+            if target not in first_runs:
+                host, port, path = target
+                first_runs[target] = store.next_run(host=host, port=port, path=path)
+            record["run"] += first_runs[target]
+            store.append(
+                record["packet_sizes"],
+                record["packet_times"],
+                record["packet_queued"],
+                host=record["host"],
+                port=record["port"],
+                path=record["path"],
+                run=record["run"],
+                ip=record["ip"],
+            )
+            record.update(packet_sizes=None, packet_times=None, packet_queued=None)
+        yield record
+
+
+def write_records(records, output_file=None, fmt=None):
+    """Write records as JSONL or CSV to a file (format taken from its extension) or stdout"""
+    if fmt is None:
+        extension = os.path.splitext(output_file or "")[1].lstrip(".")
+        fmt = extension if extension in RECORD_FORMATS else "jsonl"
+
+    f = open(output_file, "w", newline="") if output_file else None
+    try:
+        out = f or sys.stdout
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+        for record in records:
+            if fmt == "csv":
+                writer.writerow(
+                    {
+                        key: json.dumps(value)
+                        if isinstance(value, (list, dict))
+                        else value
+                        for key, value in record.items()
+                    }
+                )
+            else:
+                out.write(json.dumps(record) + "\n")
+            out.flush()
+    finally:
+        if f:
+            f.close()
@@ -0,0 +1,248 @@
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from webclient import HTTPWebClient
+from webclient.histogram import Histogram
+from webclient.pool import ConnectionPool
+
+# Default number of concurrent connections
+DEFAULT_CONNECTIONS = 10
+# Default run time in seconds when no request count is given
+DEFAULT_DURATION = 10.0
+# Percentiles reported for each latency
+BENCH_PERCENTILES = (50, 90, 99, 99.9)
+# Latencies recorded for each request
+BENCH_LATENCIES = ("connect", "tls", "ttfb", "total")
+
+
+class BenchResult:
+    """Counters and latency histograms (in ms) collected during a benchmark run
+
+    Results of runs in different processes can be merged.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.non_2xx = 0
+        self.bytes = 0
+        self.handshakes = 0  # TLS handshakes, full or resumed
+        self.resumed = 0
+        self.elapsed = 0.0
+        self.latencies = {name: Histogram() for name in BENCH_LATENCIES}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def merge(self, other):
+        """Add the counters and latencies of a run that happened at the same time"""
+        self.requests += other.requests
+        self.errors += other.errors
+        self.non_2xx += other.non_2xx
+        self.bytes += other.bytes
+        self.handshakes += other.handshakes
+        self.resumed += other.resumed
+        self.elapsed = max(self.elapsed, other.elapsed)
+        for name, histogram in other.latencies.items():
+            self.latencies[name].merge(histogram)
+        return self
+
+    def add(self, client, scheduled=None):
+        """Record a finished request, measuring its total time from `scheduled` if given"""
+        timings = client.timings
+        total = timings.phase("total")
+        if scheduled is not None:
+            # Open-loop: count the time spent waiting behind slow requests too
+            total = (timings.body - scheduled) / 1e6
+        with self._lock:
+            self.requests += 1
+            self.bytes += client.trace.total_bytes
+            if not 200 <= (client.status_code or 0) < 300:
+                self.non_2xx += 1
+            if not client.reused_connection:
+                self.latencies["connect"].record(timings.phase("connect"))
+            if client.tls_version:
+                self.handshakes += 1
+                self.resumed += bool(client.tls_resumed)
+                self.latencies["tls"].record(timings.phase("tls"))
+            self.latencies["ttfb"].record(timings.phase("ttfb"))
+            self.latencies["total"].record(total)
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def summary(self):
+        """Throughput and latency percentiles as a dict"""
+        elapsed = self.elapsed or float("nan")
+        summary = {
+            "requests": self.requests,
+            "errors": self.errors,
+            "non_2xx": self.non_2xx,
+            "elapsed": self.elapsed,
+            "requests_per_second": self.requests / elapsed,
+            "megabytes_per_second": self.bytes / 1e6 / elapsed,
+            "tls_handshakes": self.handshakes,
+            "tls_resumed": self.resumed,
+            "latencies": {},
+        }
+        for name, histogram in self.latencies.items():
+            summary["latencies"][name] = {
+                f"p{q:g}": histogram.percentile(q) for q in BENCH_PERCENTILES
+            }
+            summary["latencies"][name]["max"] = histogram.max
+        return summary
+
+    def report(self):
+        """Human readable summary"""
+        summary = self.summary()
+        columns = [f"p{q:g}" for q in BENCH_PERCENTILES] + ["max"]
+        lines = [
+            f"Requests      : {summary['requests']} "
+            f"({summary['errors']} errors, {summary['non_2xx']} non-2xx)",
+            f"Duration      : {summary['elapsed']:.2f} s",
+            f"Throughput    : {summary['requests_per_second']:.2f} req/s, "
+            f"{summary['megabytes_per_second']:.2f} MB/s",
+        ]
+        if summary["tls_handshakes"]:
+            lines.append(
+                f"TLS           : {summary['tls_handshakes']} handshakes, "
+                f"{summary['tls_resumed']} resumed"
+            )
+        lines.append(
+            "Latency (ms)  : " + "".join(f"{column:>10}" for column in columns)
+        )
+        for name, values in summary["latencies"].items():
+            if name == "tls" and not summary["tls_handshakes"]:
+                continue
+            lines.append(
+                f"  {name:<12}: "
+                + "".join(
+                    f"{'-' if values[column] is None else format(values[column], '.2f'):>10}"
+                    for column in columns
+                )
+            )
+        return "\n".join(lines)
+
+
+def run_bench(
+    host,
+    port,
+    path,
+    connections=DEFAULT_CONNECTIONS,
+    duration=None,
+    requests=None,
+    keep_alive=False,
+    rate=None,
+    **kwargs,
+):
+    """Load a server with `connections` concurrent clients and return a BenchResult
+
+    The run stops after `requests` requests or `duration` seconds (DEFAULT_DURATION if neither
+    is given). With a `rate` in requests per second, requests are started on a fixed schedule
+    (open loop) and their total time includes any delay behind that schedule.
+    """
+    if duration is None and requests is None:
+        duration = DEFAULT_DURATION
+    pool = ConnectionPool(max_per_host=connections) if keep_alive else None
+    result = BenchResult()
+    lock = threading.Lock()
+    issued = 0
+
+    start = time.perf_counter_ns()
+    deadline = None if duration is None else start + int(duration * 1e9)
+
+    def worker():
+        nonlocal issued
+        while True:
+            with lock:
+                if requests is not None and issued >= requests:
+                    return
+                slot = issued
+                issued += 1
+
+            scheduled = None
+            if rate:
+                scheduled = start + int(slot * 1e9 / rate)
+                delay = (scheduled - time.perf_counter_ns()) / 1e9
+                if delay > 0:
+                    time.sleep(delay)
+            if deadline is not None and time.perf_counter_ns() >= deadline:
+                return
+
+            client = HTTPWebClient(
+                host, port, path, pool=pool, trace_histogram=True, **kwargs
+            )
+            try:
+                for _ in client.stream():
+                    pass
+            except (OSError, ValueError, zlib.error):
+                # Malformed responses count as errors too, as in batch probes
+                result.add_error()
+                continue
+            result.add(client, scheduled)
+
+    threads = [threading.Thread(target=worker) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = (time.perf_counter_ns() - start) / 1e9
+
+    if pool:
+        pool.close()
+    return result
+
+
+def _split(total, parts, index):
+    """Share of `total` given to part `index` when split as evenly as possible"""
+    return total // parts + (index < total % parts)
+
+
+def run_bench_processes(
+    host,
+    port,
+    path,
+    processes,
+    connections=DEFAULT_CONNECTIONS,
+    duration=None,
+    requests=None,
+    rate=None,
+    **kwargs,
+):
+    """Run a benchmark sharded over worker processes and merge their results
+
+    Connections, the request count and the request rate are split between the processes, so a
+    run is not limited by a single interpreter.
+    """
+    processes = max(1, min(processes, connections))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [
+            executor.submit(
+                run_bench,
+                host,
+                port,
+                path,
+                connections=_split(connections, processes, index),
+                duration=duration,
+                requests=None
+                if requests is None
+                else _split(requests, processes, index),
+                rate=None if rate is None else rate / processes,
+                **kwargs,
+            )
+            for index in range(processes)
+        ]
+        result = BenchResult()
+        for future in futures:
+            result.merge(future.result())
+    return result
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Name of the index file kept in the cache directory
+CACHE_INDEX_FILE = "index.json"
+# Size of the reusable buffer cached bodies are read into
+CACHE_READ_SIZE = 65536  # 64K bytes
+# Response headers a 304 Not Modified must not overwrite in the stored entry
+CACHE_KEPT_HEADERS = ("content-length", "content-encoding", "transfer-encoding")
+
+
+def _http_date(value):
+    """Parse an HTTP date header into a UNIX timestamp, or None if invalid"""
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_control(headers):
+    """Parse the Cache-Control header into a dict of lowercase directives"""
+    directives = {}
+    for directive in headers.get("cache-control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def freshness_lifetime(headers):
+    """Seconds a response stays fresh once received, or None if it must not be stored
+
+    Follows Cache-Control max-age, then Expires relative to Date, minus the Age the response
+    already spent in other caches. Responses without either are stale right away, so they are
+    revalidated on every use.
+    """
+    directives = _cache_control(headers)
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    lifetime = 0
+    if directives.get("max-age", "").isdigit():
+        lifetime = int(directives["max-age"])
+    elif "expires" in headers:
+        expires = _http_date(headers["expires"])
+        date = _http_date(headers.get("date")) or time.time()
+        # Invalid dates (e.g., Expires: 0) mean already expired
+        lifetime = expires - date if expires is not None else 0
+    age = headers.get("age", "")
+    if age.isdigit():
+        lifetime -= int(age)
+    return max(0, lifetime)
+
+
+class ResponseCache:
+    """On-disk cache of HTTP responses keyed by URL, with LRU eviction
+
+    Keys are URLs, followed by the Accept-Encoding of the request when it has one. Bodies are
+    stored in one file per key and the status line, headers and expiry of every entry in an
+    index file. The least recently used entries are evicted once there are more than
+    `max_entries` entries or their bodies take more than `max_bytes` bytes.
+    """
+
+    def __init__(self, directory, max_entries=None, max_bytes=None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._index = {}  # url -> entry dict, least recently used first
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        index_file = os.path.join(directory, CACHE_INDEX_FILE)
+        if os.path.exists(index_file):
+            with open(index_file) as f:
+                self._index = json.load(f)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def total_bytes(self):
+        return sum(entry["size"] for entry in self._index.values())
+
+    def _body_file(self, url):
+        """Path of the file holding the body of a URL"""
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{digest}.body")
+
+    def _merge_index(self):
+        """Add the entries other processes sharing the directory stored meanwhile"""
+        index_file = os.path.join(self.directory, CACHE_INDEX_FILE)
+        try:
+            with open(index_file) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        others = {
+            url: entry
+            for url, entry in stored.items()
+            if url not in self._index and os.path.exists(self._body_file(url))
+        }
+        # Entries of other processes count as used before the ones of this process
+        self._index = {**others, **self._index}
+
+    def _save(self):
+        """Write the index to the index file"""
+        index_file = os.path.join(self.directory, CACHE_INDEX_FILE)
+        tmp_file = f"{index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_file, index_file)
+
+    def _evict(self):
+        """Drop least recently used entries until the limits are met"""
+        total = self.total_bytes
+        while self._index and (
+            (self.max_entries is not None and len(self._index) > self.max_entries)
+            or (self.max_bytes is not None and total > self.max_bytes)
+        ):
+            url = next(iter(self._index))
+            total -= self._index.pop(url)["size"]
+            try:
+                os.remove(self._body_file(url))
+            except FileNotFoundError:
+                pass
+
+    def get(self, url):
+        """Return the entry of a URL and mark it as recently used, or None if not cached"""
+        with self._lock:
+            entry = self._index.pop(url, None)
+            if entry is None:
+                return None
+            if not os.path.exists(self._body_file(url)):
+                self._save()
+                return None
+            self._index[url] = entry
+            return dict(entry)
+
+    def is_fresh(self, entry):
+        """Check whether an entry can be used without revalidation"""
+        return time.time() < entry["expires_at"]
+
+    def conditional_headers(self, entry):
+        """Request headers revalidating an entry with the server"""
+        headers = {}
+        if "etag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if "last-modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    def read_body(self, entry, buffer_size=CACHE_READ_SIZE):
+        """Yield the stored body of an entry in chunks read into a reusable buffer
+
+        Yields memoryviews over the buffer, which are only valid until the next chunk is read.
+        """
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        with open(self._body_file(entry["url"]), "rb") as f:
+            while True:
+                nbytes = f.readinto(buffer)
+                if not nbytes:
+                    break
+                yield view[:nbytes]
+
+    def open_body(self, url):
+        """Open a temporary file for a body being received, to be passed to put() or discard()"""
+        return open(
+            f"{self._body_file(url)}.{os.getpid()}.{threading.get_ident()}.tmp", "wb"
+        )
+
+    def discard(self, body):
+        """Close and remove a temporary body file"""
+        body.close()
+        os.remove(body.name)
+
+    def put(self, url, status_code, reason_phrase, http_version, headers, body):
+        """Store a response whose body was written to a file from open_body()
+
+        Returns False (and discards the body) if the response must not be stored.
+        """
+        body.close()
+        lifetime = freshness_lifetime(headers)
+        has_validator = "etag" in headers or "last-modified" in headers
+        if lifetime is None or (not lifetime and not has_validator):
+            os.remove(body.name)
+            return False
+
+        now = time.time()
+        entry = {
+            "url": url,
+            "status_code": status_code,
+            "reason_phrase": reason_phrase,
+            "http_version": http_version,
+            "headers": headers,
+            "stored_at": now,
+            "expires_at": now + lifetime,
+            "size": os.path.getsize(body.name),
+        }
+        with self._lock:
+            os.replace(body.name, self._body_file(url))
+            self._index.pop(url, None)
+            self._index[url] = entry
+            self._merge_index()
+            self._evict()
+            self._save()
+        return True
+
+    def refresh(self, entry, headers):
+        """Update a stored entry after a 304 Not Modified and return the updated entry"""
+        headers = {
+            name: value
+            for name, value in headers.items()
+            if name not in CACHE_KEPT_HEADERS
+        }
+        entry = dict(entry, headers={**entry["headers"], **headers})
+        lifetime = freshness_lifetime(entry["headers"])
+        entry["stored_at"] = time.time()
+        entry["expires_at"] = entry["stored_at"] + (lifetime or 0)
+        with self._lock:
+            if entry["url"] in self._index:
+                self._index[entry["url"]] = entry
+                self._save()
+        return entry
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            for url in self._index:
+                try:
+                    os.remove(self._body_file(url))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._save()
@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+from itertools import count
+from time import perf_counter_ns
+
+# Phases drawn as slices of a request, the others (like total) are covered by the request slice
+CHROME_TRACE_PHASES = ("dns", "connect", "tls", "send", "ttfb", "header", "body")
+
+
+class ChromeTraceExporter:
+    """Hook listener collecting requests as Chrome trace events (JSON Trace Event Format)
+
+    Register it with Hooks(exporter) and save() the result, which Perfetto or chrome://tracing
+    open. Each request gets its own track with a slice per phase and per connection attempt,
+    and counters of the bytes received and of the TCP_INFO samples. Timestamps are in
+    microseconds since the exporter was created.
+    """
+
+    def __init__(self):
+        self.origin = perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = []
+        self._tracks = {}  # id(client) -> [track id, bytes received so far]
+        self._track_ids = count(1)
+        self._lock = threading.Lock()
+
+    def _ts(self, timestamp):
+        return (timestamp - self.origin) / 1e3
+
+    def _track(self, client):
+        """Track id of the request of a client, starting a new track on its first event"""
+        key = id(client)
+        track = self._tracks.get(key)
+        if track is None:
+            with self._lock:
+                track = self._tracks[key] = [next(self._track_ids), 0]
+            self.events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": track[0],
+                    "args": {"name": f"#{track[0]} {client.method} {client.base_url}"},
+                }
+            )
+        return track
+
+    def _instant(self, client, name, timestamp, args=None):
+        self.events.append(
+            {
+                "name": name,
+                "ph": "i",
+                "s": "t",
+                "ts": self._ts(timestamp),
+                "pid": self.pid,
+                "tid": self._track(client)[0],
+                "args": args or {},
+            }
+        )
+
+    def _counter(self, client, name, timestamp, values):
+        track = self._track(client)
+        self.events.append(
+            {
+                "name": f"{name} #{track[0]}",
+                "ph": "C",
+                "ts": self._ts(timestamp),
+                "pid": self.pid,
+                "args": values,
+            }
+        )
+
+    def on_resolve(self, client, addresses, timestamp):
+        self._instant(
+            client,
+            "resolved",
+            timestamp,
+            {"addresses": [address[0] for _, address in addresses]},
+        )
+
+    def on_connect(self, client, attempts, timestamp):
+        tid = self._track(client)[0]
+        for attempt in attempts:
+            if attempt["time"] is None:
+                continue
+            self.events.append(
+                {
+                    "name": f"attempt {attempt['address']}",
+                    "cat": "connect",
+                    "ph": "X",
+                    "ts": self._ts(client.timings.resolved) + attempt["start"] * 1e3,
+                    "dur": attempt["time"] * 1e3,
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"result": attempt["result"], "family": attempt["family"]},
+                }
+            )
+
+    def on_tls(self, client, version, resumed, timestamp):
+        self._instant(
+            client, "tls", timestamp, {"version": version, "resumed": resumed}
+        )
+
+    def on_chunk(self, client, size, timestamp):
+        track = self._track(client)
+        track[1] += size
+        self._counter(client, "received bytes", timestamp, {"bytes": track[1]})
+
+    def on_tcp_info(self, client, sample, timestamp):
+        self._counter(
+            client,
+            "tcp_info",
+            timestamp,
+            {
+                "rtt_ms": sample["rtt"] / 1000,
+                "snd_cwnd": sample["snd_cwnd"],
+                "rcv_space": sample["rcv_space"],
+            },
+        )
+
+    def on_complete(self, client, error, timestamp):
+        """Draw the phases of the request, now that all its timings are known"""
+        tid = self._track(client)[0]
+        timings = client.timings
+        start = timings.start if timings.start is not None else timestamp
+        self.events.append(
+            {
+                "name": f"{client.method} {client.path}",
+                "cat": "request",
+                "ph": "X",
+                "ts": self._ts(start),
+                "dur": (timestamp - start) / 1e3,
+                "pid": self.pid,
+                "tid": tid,
+                "args": {
+                    "url": client.base_url,
+                    "ip": client.ip_address,
+                    "status": client.status_code,
+                    "bytes": client.trace.total_bytes,
+                    "reused_connection": client.reused_connection,
+                    "cache": client.cache_status,
+                    "error": None if error is None else repr(error),
+                },
+            }
+        )
+        for phase in CHROME_TRACE_PHASES:
+            first, last = timings.bounds(phase)
+            if first is None or last is None or last <= first:
+                continue
+            self.events.append(
+                {
+                    "name": phase,
+                    "cat": "phase",
+                    "ph": "X",
+                    "ts": self._ts(first),
+                    "dur": (last - first) / 1e3,
+                    "pid": self.pid,
+                    "tid": tid,
+                }
+            )
+        with self._lock:
+            # A new request of the same client object gets a new track
+            self._tracks.pop(id(client), None)
+
+    def to_dict(self):
+        return {"traceEvents": list(self.events), "displayTimeUnit": "ms"}
+
+    def save(self, trace_file):
+        """Write the events as a JSON trace file"""
+        with open(trace_file, "w") as f:
+            json.dump(self.to_dict(), f)
@@ -0,0 +1,95 @@
+# Number of bytes inspected at once when looking for the end of a line
+CHUNK_LINE_PEEK = 64
+
+
+class ChunkedDecoder:
+    """Incremental decoder of a chunked transfer-encoded body
+
+    Received chunks are fed as they arrive and the body data is yielded as memoryview slices of
+    them, without copying. Only the short size and trailer lines are copied. Once the body is
+    complete, `done` is set and the bytes following it are kept in `leftover`.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.leftover = memoryview(b"")
+        self.trailers = []  # Trailer lines, as bytes without the line end
+        self._line = bytearray()
+        self._remaining = 0  # Data bytes left in the current chunk
+        # Line expected next: size, data_end (CRLF after data) or trailer
+        self._state = "size"
+
+    def _end_line(self):
+        """Handle a complete line and return whether it ended the body"""
+        line = self._line
+        if self._state == "size":
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise ValueError(f"Invalid chunk size line: {bytes(line)!r}") from None
+            if size:
+                self._remaining = size
+                self._state = "data_end"
+            else:
+                self._state = "trailer"
+        elif self._state == "data_end":
+            self._state = "size"
+        elif line.strip():
+            self.trailers.append(bytes(line.rstrip(b"\r\n")))
+        else:
+            # Empty line after the last chunk ends the body
+            return True
+        line.clear()
+        return False
+
+    def feed(self, chunk):
+        """Yield the body data contained in a received chunk"""
+        if self.done:
+            return
+        chunk = memoryview(chunk)
+        pos = 0
+        while pos < len(chunk):
+            if self._remaining:
+                size = min(self._remaining, len(chunk) - pos)
+                yield chunk[pos : pos + size]
+                pos += size
+                self._remaining -= size
+                continue
+            # Lines are short, so only copy a small window to search for the line end
+            window = bytes(chunk[pos : pos + CHUNK_LINE_PEEK])
+            newline = window.find(b"\n")
+            if newline < 0:
+                self._line += window
+                pos += len(window)
+                continue
+            self._line += window[: newline + 1]
+            pos += newline + 1
+            if self._end_line():
+                self.done = True
+                self.leftover = chunk[pos:]
+                return
+
+
+def rechunk(chunks, chunk_size):
+    """Regroup a stream of chunks into pieces of `chunk_size` bytes (the last one may be shorter)
+
+    Pieces that lie within a single received chunk are yielded as slices of it without copying,
+    only pieces spanning several chunks are assembled into new bytes.
+    """
+    pending = bytearray()
+    for chunk in chunks:
+        chunk = memoryview(chunk)
+        pos = 0
+        if pending:
+            pos = min(chunk_size - len(pending), len(chunk))
+            pending += chunk[:pos]
+            if len(pending) < chunk_size:
+                continue
+            yield bytes(pending)
+            pending.clear()
+        while len(chunk) - pos >= chunk_size:
+            yield chunk[pos : pos + chunk_size]
+            pos += chunk_size
+        pending += chunk[pos:]
+    if pending:
+        yield bytes(pending)
@@ -0,0 +1,167 @@
+import mmap
+import threading
+import time
+
+from webclient import HTTPWebClient
+
+# Default number of parallel range requests
+DEFAULT_SEGMENTS = 4
+# Default number of retries of a failed segment
+DEFAULT_SEGMENT_RETRIES = 3
+
+
+def _check_content_range(client, offset):
+    """Make sure a partial response starts at the requested offset before writing it there"""
+    content_range = client.headers.get("content-range", "")
+    unit, _, byte_range = content_range.partition(" ")
+    start = byte_range.split("-", 1)[0]
+    if unit.lower() != "bytes" or not start.isdigit() or int(start) != offset:
+        raise ValueError(
+            f"Range request for offset {offset} got Content-Range: {content_range!r}"
+        )
+
+
+class SegmentedDownload:
+    """Download of a resource as byte ranges over parallel connections into a memory-mapped file
+
+    A HEAD request finds the size and whether the server accepts ranges. The output file is
+    preallocated to that size and every range is written at its offset as it arrives. A segment
+    that fails is retried from where it stopped. Servers without range support are downloaded
+    over a single connection instead.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        path,
+        output_file,
+        segments=DEFAULT_SEGMENTS,
+        retries=DEFAULT_SEGMENT_RETRIES,
+        **kwargs,
+    ):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.output_file = output_file
+        self.segments = segments
+        self.retries = retries
+        self.kwargs = kwargs
+        self.size = None
+        self.validator = None
+        self.clients = []  # Last request of each segment, with its trace
+        self.attempts = []  # Number of requests made for each segment
+        self.elapsed = None
+
+    def _probe(self):
+        """Send a HEAD request to learn the size, range support and validator of the resource"""
+        client = HTTPWebClient(
+            self.host, self.port, self.path, method="HEAD", **self.kwargs
+        )
+        client.get()
+        if client.status_code != 200:
+            raise ValueError(
+                f"HEAD {self.path} failed: {client.status_code} {client.reason_phrase}"
+            )
+        length = client.headers.get("content-length")
+        self.size = int(length) if length is not None else None
+        self.validator = client.validator
+        return "bytes" in client.headers.get("accept-ranges", "").lower()
+
+    def _ranges(self):
+        """Split the resource into (first, last) byte ranges, both inclusive"""
+        count = max(1, min(self.segments, self.size))
+        bounds = [self.size * index // count for index in range(count + 1)]
+        return [(bounds[index], bounds[index + 1] - 1) for index in range(count)]
+
+    def _fetch_segment(self, index, first, last, output, errors):
+        """Fetch one byte range into the mapped file, reporting any failure in `errors`"""
+        try:
+            self._fetch_range(index, first, last, output, errors)
+        except Exception as error:
+            # An exception would otherwise end the thread and leave the range unwritten
+            errors[index] = error
+
+    def _fetch_range(self, index, first, last, output, errors):
+        """Fetch one byte range into the mapped file, resuming after connection failures"""
+        offset = first
+        for attempt in range(self.retries + 1):
+            headers = {"Range": f"bytes={offset}-{last}"}
+            if self.validator:
+                # Fail instead of mixing two versions of the resource
+                headers["If-Range"] = self.validator
+            client = HTTPWebClient(
+                self.host, self.port, self.path, headers=headers, **self.kwargs
+            )
+            self.clients[index] = client
+            self.attempts[index] = attempt + 1
+            checked = False
+            try:
+                for chunk in client.stream():
+                    if client.status_code != 206:
+                        break
+                    if not checked:
+                        _check_content_range(client, offset)
+                        checked = True
+                    end = min(offset + len(chunk), last + 1)
+                    output[offset:end] = chunk[: end - offset]
+                    offset = end
+            except OSError:
+                pass
+            if client.status_code not in (None, 206):
+                errors[index] = ValueError(
+                    f"Range request failed: {client.status_code} {client.reason_phrase}"
+                )
+                return
+            if offset > last:
+                return
+        errors[index] = OSError(f"Segment {first}-{last} incomplete after retries")
+
+    def _download_single(self):
+        """Download the resource over one connection, straight to the output file"""
+        client = HTTPWebClient(
+            self.host, self.port, self.path, output_file=self.output_file, **self.kwargs
+        )
+        self.clients = [client]
+        self.attempts = [1]
+        with open(self.output_file, "wb") as f:
+            for chunk in client.stream():
+                f.write(chunk)
+
+    def run(self):
+        """Download the resource and return the per-segment clients"""
+        start = time.perf_counter()
+        accepts_ranges = self._probe()
+
+        if not accepts_ranges or not self.size or self.segments < 2:
+            self._download_single()
+            self.elapsed = time.perf_counter() - start
+            return self.clients
+
+        ranges = self._ranges()
+        self.clients = [None] * len(ranges)
+        self.attempts = [0] * len(ranges)
+        errors = [None] * len(ranges)
+
+        with open(self.output_file, "w+b") as f:
+            # Preallocate the file and map it, so segments land at their offset
+            f.truncate(self.size)
+            with mmap.mmap(f.fileno(), self.size) as output:
+                threads = [
+                    threading.Thread(
+                        target=self._fetch_segment,
+                        args=(index, first, last, output, errors),
+                    )
+                    for index, (first, last) in enumerate(ranges)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                output.flush()
+
+        self.elapsed = time.perf_counter() - start
+        for error in errors:
+            if error is not None:
+                raise error
+        return self.clients
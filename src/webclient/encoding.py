@@ -0,0 +1,95 @@
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional, it is only advertised when it can be decoded
+    brotli = None
+
+# Content codings the client can decode, in order of preference
+CONTENT_ENCODINGS = ("gzip", "deflate", "br") if brotli else ("gzip", "deflate")
+# Accept-Encoding request header value
+ACCEPT_ENCODING = ", ".join(CONTENT_ENCODINGS)
+# zlib window bits of each format
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+ZLIB_WBITS = zlib.MAX_WBITS
+RAW_DEFLATE_WBITS = -zlib.MAX_WBITS
+
+
+class _DeflateDecoder:
+    """Decoder of the deflate coding, which some servers send without the zlib wrapper"""
+
+    def __init__(self):
+        self._decoder = zlib.decompressobj(ZLIB_WBITS)
+        self._started = False
+
+    def decompress(self, data):
+        if self._started:
+            return self._decoder.decompress(data)
+        self._started = True
+        try:
+            return self._decoder.decompress(data)
+        except zlib.error:
+            # No zlib header, raw deflate stream
+            self._decoder = zlib.decompressobj(RAW_DEFLATE_WBITS)
+            return self._decoder.decompress(data)
+
+    def flush(self):
+        return self._decoder.flush()
+
+
+class _BrotliDecoder:
+    """Decoder of the br coding with the zlib decompressobj interface"""
+
+    def __init__(self):
+        self._decoder = brotli.Decompressor()
+
+    def decompress(self, data):
+        return self._decoder.process(bytes(data))
+
+    def flush(self):
+        return b""
+
+
+def _coding_decoder(coding):
+    """Incremental decoder of a single content coding, or None for unknown codings"""
+    if coding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(GZIP_WBITS)
+    if coding == "deflate":
+        return _DeflateDecoder()
+    if coding == "br" and brotli:
+        return _BrotliDecoder()
+    return None
+
+
+class ContentDecoder:
+    """Incremental decoder removing the Content-Encoding of a body as chunks arrive
+
+    Several codings are undone in the reverse order they were applied. Bodies with a coding
+    that cannot be decoded are passed through unchanged.
+    """
+
+    def __init__(self, content_encoding):
+        codings = [
+            coding.strip().lower()
+            for coding in content_encoding.split(",")
+            if coding.strip().lower() not in ("", "identity")
+        ]
+        decoders = [_coding_decoder(coding) for coding in reversed(codings)]
+        self.decoders = [] if None in decoders else decoders
+
+    def __bool__(self):
+        return bool(self.decoders)
+
+    def decompress(self, data):
+        """Decode the next chunk of the body, returning the decoded bytes available so far"""
+        for decoder in self.decoders:
+            data = decoder.decompress(data)
+        return data
+
+    def flush(self):
+        """Decode whatever is left once the body is complete"""
+        data = b""
+        for decoder in self.decoders:
+            data = (decoder.decompress(data) if data else b"") + decoder.flush()
+        return data
@@ -0,0 +1,145 @@
+import errno
+import os
+import selectors
+from socket import socket, AF_INET6, SOCK_STREAM, SOL_SOCKET, SO_ERROR
+from time import perf_counter_ns
+
+# Delay before starting the next connection attempt while earlier ones are pending (RFC 8305)
+CONNECTION_ATTEMPT_DELAY = 0.25  # seconds
+# connect() results meaning the attempt is in progress
+CONNECT_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN)
+
+
+def family_name(family):
+    return "IPv6" if family == AF_INET6 else "IPv4"
+
+
+def sort_addresses(addresses):
+    """Interleave (family, sockaddr) pairs by family, starting with the family listed first
+
+    The resolver lists the preferred family first (RFC 6724), so a broken network for that
+    family only delays the connection by one attempt.
+    """
+    families = {}
+    for family, address in addresses:
+        families.setdefault(family, []).append((family, address))
+    ordered = []
+    queues = list(families.values())
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [queue for queue in queues if queue]
+    return ordered
+
+
+def connect_happy_eyeballs(
+    addresses,
+    attempt_delay=CONNECTION_ATTEMPT_DELAY,
+    attempts=None,
+    timeout=None,
+    setup=None,
+):
+    """Race connection attempts to (family, sockaddr) pairs and return the first socket to connect
+
+    Attempts are started in sort_addresses() order, each `attempt_delay` seconds after the
+    previous one or as soon as it fails (RFC 8305). Returns the connected blocking socket and the
+    list of attempts, each with its address, result, start time since the first attempt and
+    duration in ms. Attempts are appended to `attempts` if given, so they are kept even when no
+    attempt succeeds, in which case the error of the last one is raised. After `timeout` seconds
+    without a connection, TimeoutError is raised. `setup` is called with every socket before it
+    connects.
+    """
+    addresses = sort_addresses(addresses)
+    if not addresses:
+        raise OSError("No address to connect to")
+
+    if attempts is None:
+        attempts = []
+    pending = {}  # socket -> attempt
+    winner = None
+    error = None
+    next_index = 0
+    begin = next_start = perf_counter_ns()
+    deadline = None if timeout is None else begin + int(timeout * 1e9)
+    selector = selectors.DefaultSelector()
+
+    def finish(sock, attempt, result, now):
+        attempt["time"] = (now - begin) / 1e6 - attempt["start"]
+        attempt["result"] = result
+        selector.unregister(sock)
+        del pending[sock]
+
+    try:
+        while winner is None:
+            now = perf_counter_ns()
+            if next_index < len(addresses) and (now >= next_start or not pending):
+                family, address = addresses[next_index]
+                next_index += 1
+                attempt = {
+                    "family": family_name(family),
+                    "address": address[0],
+                    "start": (now - begin) / 1e6,
+                    "time": None,
+                    "result": None,
+                }
+                attempts.append(attempt)
+                sock = None
+                try:
+                    sock = socket(family, SOCK_STREAM)
+                    if setup:
+                        setup(sock)
+                    sock.setblocking(False)
+                    code = sock.connect_ex(address)
+                except OSError as e:
+                    # The family is not available or an option was rejected, only this
+                    # attempt fails
+                    attempt["time"] = (perf_counter_ns() - now) / 1e6
+                    attempt["result"] = e.strerror or str(e)
+                    error = e
+                    if sock is not None:
+                        sock.close()
+                    continue
+                if code and code not in CONNECT_IN_PROGRESS:
+                    # Failed right away (e.g., refused on loopback), try the next one now
+                    attempt["time"] = (perf_counter_ns() - now) / 1e6
+                    attempt["result"] = os.strerror(code)
+                    error = OSError(code, os.strerror(code))
+                    sock.close()
+                    continue
+                pending[sock] = attempt
+                selector.register(sock, selectors.EVENT_WRITE)
+                next_start = now + int(attempt_delay * 1e9)
+                continue
+
+            if not pending:
+                raise error
+
+            if deadline is not None and now >= deadline:
+                raise TimeoutError(f"Connection timed out after {timeout} s")
+            wait_until = deadline
+            if next_index < len(addresses):
+                wait_until = min(next_start, deadline or next_start)
+            wait = None if wait_until is None else max(0, (wait_until - now) / 1e9)
+            for key, _ in selector.select(wait):
+                sock = key.fileobj
+                attempt = pending[sock]
+                code = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                now = perf_counter_ns()
+                if not code:
+                    finish(sock, attempt, "connected", now)
+                    winner = sock
+                    break
+                finish(sock, attempt, os.strerror(code), now)
+                error = OSError(code, os.strerror(code))
+                sock.close()
+                # Do not wait for the delay after a failure
+                next_start = now
+    finally:
+        now = perf_counter_ns()
+        for sock, attempt in list(pending.items()):
+            finish(sock, attempt, "cancelled", now)
+            sock.close()
+        selector.close()
+
+    winner.setblocking(True)
+    return winner, attempts
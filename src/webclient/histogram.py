@@ -0,0 +1,215 @@
+import json
+import time
+
+# Default number of bits of sub-bucket resolution (relative error below 1 / 2**(bits - 1))
+DEFAULT_SUB_BUCKET_BITS = 8
+# Default number of recorded units per value unit (1000 records ms with us resolution)
+DEFAULT_SCALE = 1000
+# Percentiles included in a summary
+SUMMARY_PERCENTILES = (50, 90, 99, 99.9)
+# Default number of histograms a rolling window is split into
+DEFAULT_ROLLING_SLOTS = 10
+
+
+class Histogram:
+    """Mergeable log-linear histogram of non-negative values, in the style of HdrHistogram
+
+    Values are scaled to integers and counted in buckets whose width grows with the value, so
+    memory only depends on the range of values, not on how many were recorded. Histograms with
+    the same sub_bucket_bits and scale can be merged.
+    """
+
+    def __init__(self, sub_bucket_bits=DEFAULT_SUB_BUCKET_BITS, scale=DEFAULT_SCALE):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.scale = scale
+        self.counts = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        """Bucket index of a scaled integer value"""
+        bits = self.sub_bucket_bits
+        if value < 1 << bits:
+            return value
+        shift = value.bit_length() - bits
+        half = 1 << (bits - 1)
+        return (1 << bits) + (shift - 1) * half + (value >> shift) - half
+
+    def _bounds(self, index):
+        """Lowest and highest scaled integer values of a bucket"""
+        bits = self.sub_bucket_bits
+        if index < 1 << bits:
+            return index, index
+        half = 1 << (bits - 1)
+        shift = (index - (1 << bits)) // half + 1
+        top = (index - (1 << bits)) % half + half
+        return top << shift, ((top + 1) << shift) - 1
+
+    def _value(self, index):
+        """Representative value of a bucket, its midpoint within the recorded min and max"""
+        low, high = self._bounds(index)
+        if self.scale == 1 and low == high:
+            # Exact integer bucket
+            value = low
+        else:
+            value = (low + high) / 2 / self.scale
+        return min(max(value, self.min), self.max)
+
+    def record(self, value, count=1):
+        """Count a value (negative values count as zero)"""
+        if value is None:
+            return
+        index = self._index(max(0, round(value * self.scale)))
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """Add the counts of another histogram with the same resolution to this one"""
+        if (other.sub_bucket_bits, other.scale) != (self.sub_bucket_bits, self.scale):
+            raise ValueError("Cannot merge histograms with a different resolution")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def reset(self):
+        """Forget all recorded values"""
+        self.counts.clear()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def percentile(self, q):
+        """Value below which `q` percent of the recorded values fall"""
+        if not self.count:
+            return None
+        rank = max(1, round(q / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self._value(index)
+        return self.max
+
+    def mode(self):
+        """Representative value of the most common bucket"""
+        if not self.count:
+            return None
+        index = max(self.counts, key=lambda index: (self.counts[index], -index))
+        return self._value(index)
+
+    def summary(self):
+        """Count, min, max, mean and the usual percentiles as a dict"""
+        summary = {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean,
+        }
+        for q in SUMMARY_PERCENTILES:
+            summary[f"p{q:g}"] = self.percentile(q)
+        return summary
+
+    def to_dict(self):
+        """Serializable (JSON friendly) state of the histogram"""
+        return {
+            "sub_bucket_bits": self.sub_bucket_bits,
+            "scale": self.scale,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "counts": sorted(self.counts.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a histogram from to_dict() output"""
+        histogram = cls(state["sub_bucket_bits"], state["scale"])
+        histogram.counts = {int(index): count for index, count in state["counts"]}
+        histogram.count = state["count"]
+        histogram.total = state["total"]
+        histogram.min = state["min"]
+        histogram.max = state["max"]
+        return histogram
+
+
+class RollingHistogram:
+    """Histogram of the values recorded during the last `window` seconds
+
+    The window is split into `slots` histograms of window / slots seconds each, reused in turn,
+    so memory stays bounded however long values are recorded. The window moves one slot at a
+    time, covering between window - window / slots and window seconds.
+    """
+
+    def __init__(self, window, slots=DEFAULT_ROLLING_SLOTS, **kwargs):
+        self.window = window
+        self.slots = slots
+        self.slot_width = window / slots
+        self._kwargs = kwargs  # Resolution of the histograms
+        self._histograms = [Histogram(**kwargs) for _ in range(slots)]
+        self._epochs = [None] * slots  # Slot number covered by each histogram
+
+    def record(self, value, now=None):
+        """Count a value at monotonic time `now` (the current time by default)"""
+        if now is None:
+            now = time.monotonic()
+        epoch = int(now // self.slot_width)
+        index = epoch % self.slots
+        if self._epochs[index] != epoch:
+            # Reuse the histogram of a slot that left the window
+            self._histograms[index].reset()
+            self._epochs[index] = epoch
+        self._histograms[index].record(value)
+
+    def merged(self, now=None):
+        """Histogram of the values still in the window"""
+        if now is None:
+            now = time.monotonic()
+        oldest = int(now // self.slot_width) - self.slots + 1
+        histogram = Histogram(**self._kwargs)
+        for slot, epoch in zip(self._histograms, self._epochs):
+            if epoch is not None and epoch >= oldest:
+                histogram.merge(slot)
+        return histogram
+
+
+def probe_histograms():
+    """Histograms fed by HTTPWebClient: connect RTT, TLS handshake, TTFB and total time in ms, chunk sizes in bytes"""
+    return {
+        "connect": Histogram(),
+        "tls": Histogram(),
+        "ttfb": Histogram(),
+        "total": Histogram(),
+        "chunk_size": Histogram(scale=1),
+    }
+
+
+def load_histograms(histograms_file):
+    """Read named histograms saved with save_histograms()"""
+    with open(histograms_file) as f:
+        return {
+            name: Histogram.from_dict(state) for name, state in json.load(f).items()
+        }
+
+
+def save_histograms(histograms, histograms_file):
+    """Write named histograms to a JSON file"""
+    with open(histograms_file, "w") as f:
+        json.dump(
+            {name: histogram.to_dict() for name, histogram in histograms.items()}, f
+        )
@@ -0,0 +1,58 @@
+# Events of the request lifecycle, in the order they happen, and the arguments their callbacks
+# get after the client (timestamps are time.perf_counter_ns() values, like the timings)
+HOOK_EVENTS = {
+    "on_resolve": ("addresses", "timestamp"),
+    "on_connect": ("attempts", "timestamp"),
+    "on_tls": ("version", "resumed", "timestamp"),
+    "on_send": ("size", "timestamp"),
+    "on_first_byte": ("timestamp",),
+    "on_chunk": ("size", "timestamp"),
+    "on_tcp_info": ("sample", "timestamp"),
+    "on_complete": ("error", "timestamp"),
+}
+
+
+def _dispatcher(callbacks):
+    """Single callable calling all the callbacks of an event, or None without callbacks"""
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def dispatch(*args):
+        for callback in callbacks:
+            callback(*args)
+
+    return dispatch
+
+
+class Hooks:
+    """Callbacks of HTTPWebClient called at each event of the request lifecycle
+
+    Every event attribute (see HOOK_EVENTS) is None until a callback is registered for it, so
+    clients skip events nobody listens to with a single check. Callbacks are called from the
+    thread running the request, with the client followed by the event arguments.
+    """
+
+    def __init__(self, *listeners, **callbacks):
+        self._callbacks = {event: [] for event in HOOK_EVENTS}
+        for event in HOOK_EVENTS:
+            setattr(self, event, None)
+        for listener in listeners:
+            self.add(listener)
+        for event, callback in callbacks.items():
+            self.register(event, callback)
+
+    def register(self, event, callback):
+        """Call `callback` on an event, after the callbacks already registered for it"""
+        if event not in HOOK_EVENTS:
+            raise ValueError(f"Unknown hook event: {event}")
+        self._callbacks[event].append(callback)
+        setattr(self, event, _dispatcher(self._callbacks[event]))
+
+    def add(self, listener):
+        """Register the methods of an object named after events (e.g., on_chunk)"""
+        for event in HOOK_EVENTS:
+            callback = getattr(listener, event, None)
+            if callback is not None:
+                self.register(event, callback)
@@ -0,0 +1,332 @@
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webclient import HTTPWebClient
+from webclient.histogram import RollingHistogram
+from webclient.tuning import SocketProfile
+
+# Default seconds between two probes of a target
+DEFAULT_INTERVAL = 15.0
+# Default fraction of the interval by which each probe is moved at random
+DEFAULT_JITTER = 0.1
+# Default number of probes running at the same time
+DEFAULT_WORKERS = 32
+# Connect and read timeout in seconds of probes whose socket profile has none
+DEFAULT_PROBE_TIMEOUT = 10.0
+# Default seconds of probes summarized by the rolling histograms
+DEFAULT_WINDOW = 300.0
+# Default address of the metrics endpoint
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9464
+# Prefix of the exposed metric names
+METRICS_PREFIX = "webclient"
+# Quantiles exposed for every rolling histogram
+METRICS_QUANTILES = (0.5, 0.9, 0.99)
+# Rolling histograms kept per target as name -> (help, factor to the exposed unit, scale)
+MONITOR_HISTOGRAMS = {
+    "connect_rtt_seconds": ("TCP connect time", 1e-3, 1000),
+    "tcp_rtt_seconds": ("Smoothed RTT reported by TCP_INFO", 1e-3, 1000),
+    "tcp_rttvar_seconds": ("RTT variance reported by TCP_INFO", 1e-3, 1000),
+    "throughput_bytes_per_second": (
+        "Response bytes over the time from sending the request to the end of the body",
+        1,
+        1,
+    ),
+}
+# Content types of the metrics in the Prometheus text format and OpenMetrics
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value):
+    """Escape a label value of the exposition format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class TargetMetrics:
+    """Counters and rolling histograms of the probes of one target
+
+    Histograms cover the last `window` seconds and their memory does not grow with the number
+    of probes. Sums and counts are kept since the start, as Prometheus summaries expect.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.probes = 0
+        self.errors = 0
+        # Probes not started because the previous one was still running
+        self.skipped = 0
+        self.bytes = 0
+        self.up = 0
+        self.last_status = None
+        self.last_probe = None  # Wall clock time of the last finished probe
+        self.histograms = {
+            name: RollingHistogram(window, scale=scale)
+            for name, (_, _, scale) in MONITOR_HISTOGRAMS.items()
+        }
+        self.sums = dict.fromkeys(MONITOR_HISTOGRAMS, 0.0)
+        self.counts = dict.fromkeys(MONITOR_HISTOGRAMS, 0)
+        self._lock = threading.Lock()
+
+    def _record(self, name, value, now):
+        if value is None:
+            return
+        self.histograms[name].record(value, now)
+        self.sums[name] += value
+        self.counts[name] += 1
+
+    def record(self, client):
+        """Account for a finished probe"""
+        now = time.monotonic()
+        timings = client.timings
+        throughput = None
+        if timings.sent is not None and timings.body is not None:
+            elapsed = (timings.body - timings.sent) / 1e9
+            throughput = client.trace.total_bytes / elapsed if elapsed > 0 else None
+        with self._lock:
+            self.probes += 1
+            self.bytes += client.trace.total_bytes
+            self.up = 1
+            self.last_status = client.status_code
+            self.last_probe = time.time()
+            self._record("connect_rtt_seconds", client.rtt_ping, now)
+            self._record("tcp_rtt_seconds", client.rtt, now)
+            self._record("tcp_rttvar_seconds", client.rttvar, now)
+            self._record("throughput_bytes_per_second", throughput, now)
+
+    def record_error(self):
+        """Account for a failed probe"""
+        with self._lock:
+            self.probes += 1
+            self.errors += 1
+            self.up = 0
+            self.last_probe = time.time()
+
+    def record_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def snapshot(self, now=None):
+        """Consistent copy of the counters, with (window histogram, sum, count) per histogram"""
+        with self._lock:
+            return {
+                "probes": self.probes,
+                "errors": self.errors,
+                "skipped": self.skipped,
+                "bytes": self.bytes,
+                "up": self.up,
+                "last_status": self.last_status,
+                "last_probe": self.last_probe,
+                "summaries": {
+                    name: (histogram.merged(now), self.sums[name], self.counts[name])
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+class Monitor:
+    """Probe targets forever, each at its own interval, and keep rolling metrics of every target
+
+    Each probe is scheduled one interval after the previous one was due, moved at random by up
+    to `jitter` times the interval so that probes of many targets do not line up, and the first
+    probes are spread over the first interval. Probes run on a pool of `workers` threads sharing
+    the resolver, TLS sessions and socket profile given as HTTPWebClient arguments. A probe due
+    while the previous one of the same target is still running is skipped and counted.
+    """
+
+    def __init__(
+        self,
+        targets,
+        interval=DEFAULT_INTERVAL,
+        jitter=DEFAULT_JITTER,
+        workers=DEFAULT_WORKERS,
+        window=DEFAULT_WINDOW,
+        **kwargs,
+    ):
+        # (host, port, path, interval) with the default interval filled in
+        self.targets = []
+        for host, port, path, *rest in targets:
+            target_interval = rest[0] if rest else None
+            self.targets.append((host, port, path, target_interval or interval))
+        self.jitter = jitter
+        self.workers = workers
+        # A probe that hangs would hold a worker forever
+        profile = kwargs.get("profile") or SocketProfile()
+        kwargs["profile"] = profile.replace(
+            connect_timeout=profile.connect_timeout or DEFAULT_PROBE_TIMEOUT,
+            read_timeout=profile.read_timeout or DEFAULT_PROBE_TIMEOUT,
+        )
+        self.kwargs = kwargs
+        self.metrics = [TargetMetrics(window) for _ in self.targets]
+        self._running = set()  # Indexes of the targets being probed
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _next_due(self, due, interval, now):
+        """Time the next probe is due after one that was due at `due`"""
+        if now - due > interval:
+            # Too far behind schedule, do not try to catch up
+            due = now
+        return due + interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _probe(self, index):
+        host, port, path, _ = self.targets[index]
+        client = HTTPWebClient(host, port, path, trace_histogram=True, **self.kwargs)
+        try:
+            for _ in client.stream():
+                pass
+        except (OSError, ValueError):
+            self.metrics[index].record_error()
+        else:
+            self.metrics[index].record(client)
+        finally:
+            with self._lock:
+                self._running.discard(index)
+
+    def run(self, duration=None):
+        """Probe the targets until stop() is called or for `duration` seconds"""
+        start = time.monotonic()
+        deadline = None if duration is None else start + duration
+        schedule = [
+            (start + random.uniform(0, interval), index)
+            for index, (_, _, _, interval) in enumerate(self.targets)
+        ]
+        heapq.heapify(schedule)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while schedule:
+                due, index = schedule[0]
+                if deadline is not None and due >= deadline:
+                    break
+                if self._stop.wait(max(0, due - time.monotonic())):
+                    break
+                interval = self.targets[index][3]
+                heapq.heapreplace(
+                    schedule, (self._next_due(due, interval, time.monotonic()), index)
+                )
+                with self._lock:
+                    if index in self._running:
+                        self.metrics[index].record_skipped()
+                        continue
+                    self._running.add(index)
+                executor.submit(self._probe, index)
+
+    def stop(self):
+        self._stop.set()
+
+    def exposition(self, openmetrics=False):
+        """Metrics of all targets in the Prometheus text format, or OpenMetrics"""
+        lines = []
+
+        def family(name, kind, description, samples):
+            # OpenMetrics names counter families without their _total suffix
+            family_name = name.removesuffix("_total") if openmetrics else name
+            lines.append(f"# HELP {METRICS_PREFIX}_{family_name} {description}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{family_name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(
+                    f"{METRICS_PREFIX}_{name}{suffix}{_format_labels(labels)} {value}"
+                )
+
+        now = time.monotonic()
+        targets = [
+            ((("host", host), ("port", port), ("path", path)), metrics.snapshot(now))
+            for (host, port, path, _), metrics in zip(self.targets, self.metrics)
+        ]
+
+        counters = (
+            ("probes_total", "probes", "Probes finished"),
+            ("probe_errors_total", "errors", "Probes that failed"),
+            (
+                "probes_skipped_total",
+                "skipped",
+                "Probes skipped, the previous one was running",
+            ),
+            ("response_bytes_total", "bytes", "Response bytes received"),
+        )
+        for name, key, description in counters:
+            samples = [("", labels, state[key]) for labels, state in targets]
+            family(name, "counter", description, samples)
+
+        family(
+            "up",
+            "gauge",
+            "Whether the last probe succeeded",
+            [("", labels, state["up"]) for labels, state in targets],
+        )
+        family(
+            "last_status_code",
+            "gauge",
+            "Status code of the last successful probe",
+            [
+                ("", labels, state["last_status"])
+                for labels, state in targets
+                if state["last_status"] is not None
+            ],
+        )
+        family(
+            "last_probe_timestamp_seconds",
+            "gauge",
+            "Time the last probe finished",
+            [
+                ("", labels, f"{state['last_probe']:.3f}")
+                for labels, state in targets
+                if state["last_probe"] is not None
+            ],
+        )
+
+        for name, (description, factor, _) in MONITOR_HISTOGRAMS.items():
+            samples = []
+            for labels, state in targets:
+                histogram, total, count = state["summaries"][name]
+                for q in METRICS_QUANTILES:
+                    value = histogram.percentile(q * 100)
+                    if value is not None:
+                        samples.append(
+                            ("", labels + (("quantile", q),), f"{value * factor:g}")
+                        )
+                samples.append(("_sum", labels, f"{total * factor:g}"))
+                samples.append(("_count", labels, count))
+            family(name, "summary", f"{description} (window quantiles)", samples)
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the metrics of the server's monitor on /metrics"""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+        body = self.server.monitor.exposition(openmetrics).encode()
+        self.send_response(200)
+        self.send_header(
+            "Content-Type",
+            OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE,
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to log
+        pass
+
+
+def serve_metrics(monitor, host=DEFAULT_METRICS_HOST, port=DEFAULT_METRICS_PORT):
+    """Serve the metrics of a monitor over HTTP from a background thread and return the server"""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.monitor = monitor
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,84 @@
+import select
+import threading
+import time
+
+# Default number of seconds an idle connection is kept around
+DEFAULT_IDLE_TIMEOUT = 30.0
+# Default number of simultaneous connections per (host, port)
+DEFAULT_MAX_PER_HOST = 6
+
+
+class ConnectionPool:
+    """Pool of persistent sockets keyed by (host, port)
+
+    A slot is reserved with acquire() and given back with release(). acquire() returns an idle
+    socket to reuse, or None when the caller has to open a new connection itself. At most
+    max_per_host connections (idle or in use) exist per key; further acquire() calls block.
+    """
+
+    def __init__(
+        self, max_per_host=DEFAULT_MAX_PER_HOST, idle_timeout=DEFAULT_IDLE_TIMEOUT
+    ):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self._idle = {}  # (host, port) -> [(sock, released_at), ...]
+        self._in_use = {}  # (host, port) -> number of connections handed out
+        self._lock = threading.Condition()
+
+    def _is_alive(self, sock):
+        """Check that an idle socket was not closed by the server (nothing should be readable)"""
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _pop_idle(self, key):
+        """Return the most recently used idle socket that is still usable, closing stale ones"""
+        idle = self._idle.get(key, [])
+        now = time.monotonic()
+        while idle:
+            sock, released_at = idle.pop()
+            if now - released_at <= self.idle_timeout and self._is_alive(sock):
+                return sock
+            sock.close()
+        return None
+
+    def acquire(self, host, port):
+        """Reserve a connection slot and return an idle socket for it, or None to connect anew"""
+        key = (host, port)
+        with self._lock:
+            while True:
+                sock = self._pop_idle(key)
+                if sock is not None:
+                    break
+                if self._in_use.get(key, 0) < self.max_per_host:
+                    break
+                self._lock.wait()
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            return sock
+
+    def release(self, host, port, sock, reusable=True):
+        """Give a connection slot back, keeping the socket idle if it can be reused"""
+        key = (host, port)
+        with self._lock:
+            self._in_use[key] -= 1
+            if reusable and sock is not None:
+                self._idle.setdefault(key, []).append((sock, time.monotonic()))
+            elif sock is not None:
+                sock.close()
+            self._lock.notify()
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            for idle in self._idle.values():
+                for sock, _ in idle:
+                    sock.close()
+            self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
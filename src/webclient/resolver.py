@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socket import getaddrinfo, gaierror, AF_INET, AF_INET6, AF_UNSPEC, SOCK_STREAM
+
+# Default number of seconds a resolved name is cached
+DEFAULT_DNS_TTL = 300.0
+# Default number of names resolved at the same time by prefetch()
+DEFAULT_PREFETCH_WORKERS = 32
+
+
+class Resolver:
+    """Name resolver caching getaddrinfo() results in memory and optionally on disk
+
+    Entries expire `ttl` seconds after being resolved. With a cache file, entries are loaded
+    from and saved to it as JSON, so they survive between runs.
+    """
+
+    def __init__(self, ttl=DEFAULT_DNS_TTL, cache_file=None):
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self._cache = {}  # host -> (expires_at, [(family, address), ...])
+        self._lock = threading.Lock()
+
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file) as f:
+                for host, (expires_at, entries) in json.load(f).items():
+                    self._cache[host] = (
+                        expires_at,
+                        [(family, tuple(address)) for family, address in entries],
+                    )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _lookup(self, host):
+        """Resolve all stream addresses of a host, without the port"""
+        entries = []
+        for family, _, _, _, sockaddr in getaddrinfo(
+            host, None, AF_UNSPEC, SOCK_STREAM
+        ):
+            if family not in (AF_INET, AF_INET6):
+                continue
+            # Drop the port, keep IPv6 flow info and scope id
+            entry = (family, (sockaddr[0], *sockaddr[2:]))
+            if entry not in entries:
+                entries.append(entry)
+        return entries
+
+    def _save(self):
+        """Write the cache to the cache file"""
+        tmp_file = f"{self.cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def _cached(self, host, save=True):
+        """Cache entry of a host and whether it was looked up, as it was missing or expired
+
+        The cache file is only written when `save` is set.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(host)
+        if cached is not None and cached[0] >= now:
+            return cached, False
+        cached = (now + self.ttl, self._lookup(host))
+        with self._lock:
+            self._cache[host] = cached
+            if save and self.cache_file:
+                self._save()
+        return cached, True
+
+    def resolve(self, host, port, family=AF_UNSPEC):
+        """Return the (family, sockaddr) pairs of a host, from the cache while not expired"""
+        cached, _ = self._cached(host)
+        addresses = [
+            (entry_family, (address[0], port, *address[1:]))
+            for entry_family, address in cached[1]
+            if family in (AF_UNSPEC, entry_family)
+        ]
+        if not addresses:
+            raise gaierror(f"No address found for {host}")
+        return addresses
+
+    def prefetch(self, hosts, workers=DEFAULT_PREFETCH_WORKERS):
+        """Resolve many hosts in parallel to fill the cache, returning the ones that failed"""
+        hosts = list(dict.fromkeys(hosts))
+        looked_up = []
+
+        def resolve(host):
+            try:
+                # The cache file is written once at the end, not once per host
+                cached, missed = self._cached(host, save=False)
+                looked_up.append(missed)
+                if not cached[1]:
+                    raise gaierror(f"No address found for {host}")
+            except OSError as e:
+                return host, e
+            return host, None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            failed = {
+                host: error
+                for host, error in executor.map(resolve, hosts)
+                if error is not None
+            }
+        if self.cache_file and any(looked_up):
+            with self._lock:
+                self._save()
+        return failed
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._cache.clear()
+            if self.cache_file:
+                self._save()
@@ -0,0 +1,109 @@
+import re
+
+# Regex pattern to find the charset of a Content-Type header (e.g., text/html; charset=utf-8)
+CHARSET_PATTERN = re.compile(r";\s*charset=\"?([^\s;\"]+)", re.IGNORECASE)
+# Encoding of text bodies that do not declare a charset
+DEFAULT_TEXT_ENCODING = "utf-8"
+
+
+class Response:
+    """Response to an HTTP request, available as soon as its header block has been parsed
+
+    The body stays on the connection until asked for: streamed with iter_body(), kept whole
+    with read() (and content or text), or skipped with drain(). Closing the response before
+    that aborts the transfer. Text is only decoded when first accessed.
+    """
+
+    def __init__(
+        self,
+        url,
+        status_code,
+        reason_phrase,
+        http_version,
+        headers,
+        chunks=(),
+        first_chunk=None,
+        body=None,
+        timings=None,
+    ):
+        self.url = url
+        self.status_code = status_code
+        self.reason_phrase = reason_phrase
+        self.http_version = http_version
+        self.headers = headers
+        self._chunks = chunks
+        self._first_chunk = first_chunk
+        self.timings = timings
+        self._body = body
+        self._text = None
+        self.consumed = body is not None
+
+    def __repr__(self):
+        return f"<Response [{self.status_code} {self.reason_phrase}]>"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def content_length(self):
+        length = self.headers.get("content-length")
+        return int(length) if length is not None else None
+
+    def iter_body(self):
+        """Yield the body in chunks as they arrive
+
+        Yields memoryviews that are only valid until the next chunk is received.
+        """
+        if self._body is not None:
+            yield memoryview(self._body)
+            return
+        if self.consumed:
+            raise RuntimeError("Response body already consumed")
+        self.consumed = True
+        if self._first_chunk is not None:
+            first_chunk, self._first_chunk = self._first_chunk, None
+            yield first_chunk
+        yield from self._chunks
+
+    def read(self):
+        """Read the rest of the body and return the whole body as a memoryview"""
+        if self._body is None:
+            body = bytearray()
+            for chunk in self.iter_body():
+                body += chunk
+            self._body = body
+        return memoryview(self._body)
+
+    @property
+    def content(self):
+        return bytes(self.read())
+
+    @property
+    def encoding(self):
+        match = CHARSET_PATTERN.search(self.headers.get("content-type", ""))
+        return match.group(1) if match else DEFAULT_TEXT_ENCODING
+
+    @property
+    def text(self):
+        if self._text is None:
+            try:
+                self._text = str(self.read(), self.encoding, errors="replace")
+            except LookupError:
+                # Unknown charset
+                self._text = str(self.read(), DEFAULT_TEXT_ENCODING, errors="replace")
+        return self._text
+
+    def drain(self):
+        """Receive the rest of the body without keeping it"""
+        for _ in self.iter_body():
+            pass
+
+    def close(self):
+        """Stop receiving the body, closing the connection if it is not complete"""
+        self._first_chunk = None
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+        self.consumed = True
@@ -0,0 +1,120 @@
+import struct
+from socket import IPPROTO_TCP
+
+# TCP_INFO socket option (Linux)
+TCP_INFO = 11
+# Buffer requested from the kernel, larger than any known struct tcp_info
+TCP_INFO_BUFFER_SIZE = 512
+
+# Fields of the Linux struct tcp_info (include/uapi/linux/tcp.h) in order, with their struct
+# format. Times are in microseconds, rates in bytes per second, windows in segments.
+TCP_INFO_FIELDS = [
+    ("state", "B"),
+    ("ca_state", "B"),
+    ("retransmits", "B"),
+    ("probes", "B"),
+    ("backoff", "B"),
+    ("options", "B"),
+    ("wscale", "B"),  # snd_wscale:4, rcv_wscale:4
+    ("flags", "B"),  # delivery_rate_app_limited:1, fastopen_client_fail:2
+    ("rto", "I"),
+    ("ato", "I"),
+    ("snd_mss", "I"),
+    ("rcv_mss", "I"),
+    ("unacked", "I"),
+    ("sacked", "I"),
+    ("lost", "I"),
+    ("retrans", "I"),
+    ("fackets", "I"),
+    ("last_data_sent", "I"),
+    ("last_ack_sent", "I"),
+    ("last_data_recv", "I"),
+    ("last_ack_recv", "I"),
+    ("pmtu", "I"),
+    ("rcv_ssthresh", "I"),
+    ("rtt", "I"),
+    ("rttvar", "I"),
+    ("snd_ssthresh", "I"),
+    ("snd_cwnd", "I"),
+    ("advmss", "I"),
+    ("reordering", "I"),
+    ("rcv_rtt", "I"),
+    ("rcv_space", "I"),
+    ("total_retrans", "I"),
+    ("pacing_rate", "Q"),
+    ("max_pacing_rate", "Q"),
+    ("bytes_acked", "Q"),
+    ("bytes_received", "Q"),
+    ("segs_out", "I"),
+    ("segs_in", "I"),
+    ("notsent_bytes", "I"),
+    ("min_rtt", "I"),
+    ("data_segs_in", "I"),
+    ("data_segs_out", "I"),
+    ("delivery_rate", "Q"),
+    ("busy_time", "Q"),
+    ("rwnd_limited", "Q"),
+    ("sndbuf_limited", "Q"),
+    ("delivered", "I"),
+    ("delivered_ce", "I"),
+    ("bytes_sent", "Q"),
+    ("bytes_retrans", "Q"),
+    ("dsack_dups", "I"),
+    ("reord_seen", "I"),
+    ("rcv_ooopack", "I"),
+    ("snd_wnd", "I"),
+    ("rcv_wnd", "I"),
+    ("rehash", "I"),
+    ("total_rto", "H"),
+    ("total_rto_recoveries", "H"),
+    ("total_rto_time", "I"),
+    ("received_ce", "I"),
+    ("delivered_e1_bytes", "I"),
+    ("delivered_e0_bytes", "I"),
+    ("delivered_ce_bytes", "I"),
+    ("received_e1_bytes", "I"),
+    ("received_e0_bytes", "I"),
+    ("received_ce_bytes", "I"),
+    ("accecn_fail_mode", "H"),
+    ("accecn_opt_seen", "H"),
+]
+
+
+def _layout(fields):
+    """Compute the (name, struct, offset) of each field with native alignment"""
+    layout = []
+    offset = 0
+    for name, fmt in fields:
+        field = struct.Struct("=" + fmt)
+        offset += -offset % field.size
+        layout.append((name, field, offset))
+        offset += field.size
+    return layout
+
+
+TCP_INFO_LAYOUT = _layout(TCP_INFO_FIELDS)
+
+
+def decode_tcp_info(data):
+    """Decode a struct tcp_info, keeping only the fields the kernel filled in"""
+    info = {}
+    for name, field, offset in TCP_INFO_LAYOUT:
+        if offset + field.size > len(data):
+            break
+        info[name] = field.unpack_from(data, offset)[0]
+
+    # Split the bitfields
+    if "wscale" in info:
+        wscale = info.pop("wscale")
+        info["snd_wscale"] = wscale & 0x0F
+        info["rcv_wscale"] = wscale >> 4
+    if "flags" in info:
+        flags = info.pop("flags")
+        info["delivery_rate_app_limited"] = flags & 0x01
+        info["fastopen_client_fail"] = (flags >> 1) & 0x03
+    return info
+
+
+def read_tcp_info(sock):
+    """Query the Linux kernel for the TCP statistics of a socket using getsockopt(TCP_INFO)"""
+    return decode_tcp_info(sock.getsockopt(IPPROTO_TCP, TCP_INFO, TCP_INFO_BUFFER_SIZE))
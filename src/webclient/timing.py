@@ -0,0 +1,71 @@
+from time import perf_counter_ns
+
+# Marks taken along the request lifecycle, in order
+TIMING_MARKS = (
+    "start",
+    "resolved",
+    "connected",
+    "secured",
+    "sent",
+    "first_byte",
+    "header",
+    "body",
+)
+# Phases as (first mark, last mark) pairs
+TIMING_PHASES = {
+    "dns": ("start", "resolved"),
+    "connect": ("resolved", "connected"),
+    "tls": ("connected", "secured"),
+    "send": ("secured", "sent"),
+    "ttfb": ("sent", "first_byte"),
+    "header": ("first_byte", "header"),
+    "body": ("header", "body"),
+    "total": ("start", "body"),
+}
+# Marks of steps some requests skip (the TLS handshake over plain HTTP), which stay unset, and
+# the mark the phases starting at them start at instead
+TIMING_OPTIONAL_MARKS = {"secured": "connected"}
+
+
+class Timings:
+    """Monotonic nanosecond timestamps of the request lifecycle split into phases
+
+    Marks are taken with time.perf_counter_ns(), so phases are not affected by wall clock jumps.
+    """
+
+    __slots__ = TIMING_MARKS
+
+    def __init__(self):
+        for name in TIMING_MARKS:
+            setattr(self, name, None)
+
+    def mark(self, name, timestamp=None):
+        """Record a lifecycle mark, now unless a perf_counter_ns() timestamp is given"""
+        setattr(self, name, perf_counter_ns() if timestamp is None else timestamp)
+
+    def bounds(self, name):
+        """First and last timestamps of a phase, either None if its mark is missing"""
+        first, last = TIMING_PHASES[name]
+        start = getattr(self, first)
+        if start is None and first in TIMING_OPTIONAL_MARKS:
+            start = getattr(self, TIMING_OPTIONAL_MARKS[first])
+        return start, getattr(self, last)
+
+    def phase(self, name):
+        """Duration of a phase in milliseconds, or None if one of its marks is missing"""
+        first, last = self.bounds(name)
+        if first is None or last is None:
+            return None
+        return (last - first) / 1e6
+
+    def as_dict(self):
+        """Durations of all phases in milliseconds"""
+        return {name: self.phase(name) for name in TIMING_PHASES}
+
+    def __repr__(self):
+        phases = ", ".join(
+            f"{name}={duration:.3f}ms"
+            for name, duration in self.as_dict().items()
+            if duration is not None
+        )
+        return f"Timings({phases})"
@@ -0,0 +1,82 @@
+import ssl
+import threading
+
+# Number of hosts whose TLS session is kept, the least recently stored are dropped first
+MAX_TLS_SESSIONS = 256
+# ALPN protocols offered in the handshake
+TLS_ALPN_PROTOCOLS = ["http/1.1"]
+
+
+def create_context(verify=True, cafile=None):
+    """Client SSLContext verifying certificates against the system (or `cafile`) CAs"""
+    context = ssl.create_default_context(cafile=cafile)
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    context.set_alpn_protocols(TLS_ALPN_PROTOCOLS)
+    return context
+
+
+class TLSSessionCache:
+    """TLS context shared by the connections of one or more clients, with the last session per host
+
+    Connecting again to a host offers its session (ID or ticket), so the server can resume it
+    and skip the certificate exchange and key agreement of a full handshake. Sessions only
+    resume within the context that created them, so clients sharing sessions share this object.
+    When pickled (e.g., to a worker process), the context is created again and no session is
+    kept.
+    """
+
+    def __init__(
+        self,
+        verify=True,
+        cafile=None,
+        resume=True,
+        max_sessions=MAX_TLS_SESSIONS,
+        context=None,
+    ):
+        self.verify = verify
+        self.cafile = cafile
+        self.resume = resume
+        self.max_sessions = max_sessions
+        self.context = context or create_context(verify, cafile)
+        self._sessions = {}  # (host, port) -> ssl.SSLSession, least recently stored first
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # Neither the context nor the sessions can be pickled
+        return (
+            TLSSessionCache,
+            (self.verify, self.cafile, self.resume, self.max_sessions),
+        )
+
+    def wrap(self, sock, host, port):
+        """Perform the TLS handshake over a connected socket, resuming the session of the host"""
+        session = None
+        if self.resume:
+            with self._lock:
+                session = self._sessions.get((host, port))
+        tls_sock = self.context.wrap_socket(
+            sock, server_hostname=host, do_handshake_on_connect=False, session=session
+        )
+        try:
+            tls_sock.do_handshake()
+        except BaseException:
+            tls_sock.close()
+            raise
+        return tls_sock
+
+    def store(self, host, port, tls_sock):
+        """Keep the session of a connection to resume it on the next one to the same host
+
+        With TLS 1.3 the server sends its session tickets after the handshake, so this is best
+        called once the response has been received.
+        """
+        if not self.resume or tls_sock.session is None:
+            return
+        key = (host, port)
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._sessions[key] = tls_sock.session
+            while len(self._sessions) > self.max_sessions:
+                del self._sessions[next(iter(self._sessions))]
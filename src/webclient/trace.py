@@ -0,0 +1,147 @@
+import fcntl
+import socket
+import struct
+import time
+from array import array
+from time import perf_counter_ns
+
+# Socket options and control messages (Linux), not all exposed by the socket module
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+TCP_INQ = getattr(socket, "TCP_INQ", 36)
+TCP_CM_INQ = TCP_INQ
+SIOCINQ = 0x541B  # Same as FIONREAD
+
+# struct timespec and int as sent in the control messages
+TIMESPEC = struct.Struct("@ll")
+CMSG_INT = struct.Struct("@i")
+# Space for both control messages
+ANCILLARY_BUFFER_SIZE = socket.CMSG_SPACE(TIMESPEC.size) + socket.CMSG_SPACE(
+    CMSG_INT.size
+)
+
+
+def enable_kernel_timestamps(sock):
+    """Ask the kernel to report arrival timestamps and queue depth with every read
+
+    Returns the offset to subtract from kernel (CLOCK_REALTIME) timestamps to bring them on the
+    time.perf_counter_ns() clock.
+    """
+    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, TCP_INQ, 1)
+    except OSError:
+        # Older kernel, queue depth is queried with SIOCINQ instead
+        pass
+    return time.time_ns() - perf_counter_ns()
+
+
+def queued_bytes(sock):
+    """Number of bytes waiting in the socket receive queue (SIOCINQ)"""
+    result = fcntl.ioctl(sock.fileno(), SIOCINQ, CMSG_INT.pack(0))
+    return CMSG_INT.unpack(result)[0]
+
+
+def recv_timestamped(sock, buffer):
+    """Receive into a buffer with recvmsg and return (nbytes, kernel arrival time in ns, queued bytes)
+
+    The arrival time is None if the kernel did not report one.
+    """
+    nbytes, ancdata, _, _ = sock.recvmsg_into([buffer], ANCILLARY_BUFFER_SIZE)
+    arrival_time = None
+    queued = None
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SCM_TIMESTAMPNS:
+            seconds, nanoseconds = TIMESPEC.unpack_from(data)
+            arrival_time = seconds * 1_000_000_000 + nanoseconds
+        elif level == socket.IPPROTO_TCP and kind == TCP_CM_INQ:
+            queued = CMSG_INT.unpack_from(data)[0]
+    if queued is None:
+        queued = queued_bytes(sock)
+    return nbytes, arrival_time, queued
+
+
+class PacketTrace:
+    """Packet sizes and times of a response stored in typed arrays
+
+    Times are kept in ms since `start`, a time.perf_counter_ns() timestamp. With a capacity only
+    the last `capacity` packets are kept (ring buffer). In histogram mode no packet is kept, only
+    the number of packets of each size. Totals always cover the whole response.
+    """
+
+    __slots__ = (
+        "start",
+        "capacity",
+        "histogram",
+        "count",
+        "total_bytes",
+        "decoded_bytes",
+        "last_time",
+        "size_counts",
+        "_sizes",
+        "_times",
+        "_queued",
+        "_next",
+    )
+
+    def __init__(self, start=0, capacity=None, histogram=False, queue_depth=False):
+        self.start = start
+        self.capacity = capacity
+        self.histogram = histogram
+        self.count = 0
+        self.total_bytes = 0  # Bytes received, as sent on the wire
+        self.decoded_bytes = None  # Body bytes once the content encoding is removed
+        self.last_time = None
+        self.size_counts = {}
+        self._sizes = array("I")
+        self._times = array("d")
+        self._queued = array("I") if queue_depth else None
+        self._next = 0  # Slot overwritten next once the ring buffer is full
+
+    def append(self, size, timestamp, queued=0):
+        """Add a packet received at a time.perf_counter_ns() timestamp"""
+        time_ms = (timestamp - self.start) / 1e6
+        self.count += 1
+        self.total_bytes += size
+        self.last_time = time_ms
+        if self.histogram:
+            if size:
+                self.size_counts[size] = self.size_counts.get(size, 0) + 1
+            return
+
+        if self.capacity is None or len(self._sizes) < self.capacity:
+            self._sizes.append(size)
+            self._times.append(time_ms)
+            if self._queued is not None:
+                self._queued.append(queued)
+            return
+
+        self._sizes[self._next] = size
+        self._times[self._next] = time_ms
+        if self._queued is not None:
+            self._queued[self._next] = queued
+        self._next = (self._next + 1) % self.capacity
+
+    def _ordered(self, values):
+        """Values of the kept packets, oldest first"""
+        if not self._next:
+            return values
+        return values[self._next :] + values[: self._next]
+
+    @property
+    def sizes(self):
+        return self._ordered(self._sizes)
+
+    @property
+    def times(self):
+        return self._ordered(self._times)
+
+    @property
+    def queued(self):
+        if self._queued is None:
+            return array("I")
+        return self._ordered(self._queued)
+
+    def __len__(self):
+        """Number of packets kept"""
+        return len(self._sizes)
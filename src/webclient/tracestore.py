@@ -0,0 +1,171 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+# Magic bytes starting every frame of a trace store
+TRACE_FRAME_MAGIC = b"WCTF"
+# Frame header: magic, metadata length and payload length (metadata and columns, padded)
+TRACE_FRAME_HEADER = struct.Struct("<4sIQ")
+# Columns are aligned to this many bytes so they can be cast in place
+TRACE_COLUMN_ALIGNMENT = 8
+# Array type code of each column
+TRACE_COLUMNS = {"sizes": "I", "times": "d", "queued": "I"}
+
+
+def _padding(size):
+    return -size % TRACE_COLUMN_ALIGNMENT
+
+
+class TraceStore:
+    """Append-only file of packet traces stored as typed binary columns
+
+    Each trace is a frame: a small header, its metadata as JSON (target, run, ...) and the
+    packet sizes (uint32), times (float64, ms since the connection start) and queue depths
+    (uint32, when measured) as raw arrays. Listing the traces only reads the headers and
+    metadata, and a trace is read by memory-mapping its columns, without parsing the others.
+    Appending never rewrites earlier frames, and a frame cut short by a crash is dropped before
+    the next one is appended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+        self._map = None
+        self._end = None  # End of the last complete frame when the file was last seen
+
+    def _frames(self, f):
+        """Yield (offset, metadata length, end) of the complete frames of an open store file"""
+        size = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + TRACE_FRAME_HEADER.size <= size:
+            f.seek(offset)
+            magic, meta_length, payload_length = TRACE_FRAME_HEADER.unpack(
+                f.read(TRACE_FRAME_HEADER.size)
+            )
+            end = offset + TRACE_FRAME_HEADER.size + payload_length
+            if magic != TRACE_FRAME_MAGIC or end > size:
+                # Not a trace store, or a frame cut short while written
+                return
+            yield offset, meta_length, end
+            offset = end
+
+    def append(self, sizes, times, queued=None, **metadata):
+        """Store the columns of a trace with its metadata (e.g., host, port, path, run)"""
+        columns = {
+            "sizes": array(TRACE_COLUMNS["sizes"], sizes),
+            "times": array(TRACE_COLUMNS["times"], times),
+        }
+        if queued:
+            columns["queued"] = array(TRACE_COLUMNS["queued"], queued)
+        metadata = {
+            **metadata,
+            "count": len(columns["sizes"]),
+            "columns": list(columns),
+            "byteorder": sys.byteorder,
+        }
+        meta = json.dumps(metadata).encode()
+        parts = [meta, bytes(_padding(len(meta)))]
+        for column in columns.values():
+            data = column.tobytes()
+            parts += [data, bytes(_padding(len(data)))]
+        payload = b"".join(parts)
+        with open(self.path, "a+b") as f:
+            size = os.fstat(f.fileno()).st_size
+            if self._end != size:
+                # Written by someone else meanwhile, find where the complete frames end
+                self._end = 0
+                for _, _, self._end in self._frames(f):
+                    pass
+            if size > self._end:
+                # Drop a frame cut short, or the new one would be read as its continuation
+                f.truncate(self._end)
+            f.write(TRACE_FRAME_HEADER.pack(TRACE_FRAME_MAGIC, len(meta), len(payload)))
+            f.write(payload)
+            self._end += TRACE_FRAME_HEADER.size + len(payload)
+        # The index is rebuilt on the next lookup
+        self._index = None
+
+    def append_trace(self, trace, **metadata):
+        """Store a PacketTrace (see webclient.trace) with its metadata"""
+        self.append(trace.sizes, trace.times, trace.queued, **metadata)
+
+    def index(self):
+        """Metadata of every stored trace, with the offset of its columns in the file"""
+        if self._index is not None:
+            return self._index
+        entries = []
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for offset, meta_length, _ in self._frames(f):
+                    f.seek(offset + TRACE_FRAME_HEADER.size)
+                    entry = json.loads(f.read(meta_length))
+                    entry["offset"] = (
+                        offset
+                        + TRACE_FRAME_HEADER.size
+                        + meta_length
+                        + _padding(meta_length)
+                    )
+                    entries.append(entry)
+        self._index = entries
+        return entries
+
+    def find(self, **criteria):
+        """Entries of the traces whose metadata match all criteria (e.g., host=..., run=0)"""
+        return [
+            entry
+            for entry in self.index()
+            if all(entry.get(key) == value for key, value in criteria.items())
+        ]
+
+    def next_run(self, **criteria):
+        """Run number following the ones of the stored traces matching the criteria, else 0"""
+        return (
+            max((entry.get("run", -1) for entry in self.find(**criteria)), default=-1)
+            + 1
+        )
+
+    def read(self, entry):
+        """Columns of a stored trace as typed memoryviews over the memory-mapped file
+
+        The views keep the mapping alive while they are referenced. Traces written on a machine
+        with the other byte order are copied into arrays instead.
+        """
+        lengths = [
+            entry["count"] * array(TRACE_COLUMNS[name]).itemsize
+            for name in entry["columns"]
+        ]
+        end = entry["offset"] + sum(length + _padding(length) for length in lengths)
+        if self._map is None or len(self._map) < end:
+            # Map the file again when it grew, views of the previous mapping keep it alive
+            with open(self.path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        columns = {}
+        offset = entry["offset"]
+        for name, length in zip(entry["columns"], lengths):
+            typecode = TRACE_COLUMNS[name]
+            column = view[offset : offset + length].cast(typecode)
+            if entry["byteorder"] != sys.byteorder:
+                column = array(typecode, column)
+                column.byteswap()
+            columns[name] = column
+            offset += length + _padding(length)
+        return columns
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # Columns still referenced, unmapped once they are released
+                pass
+            self._map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
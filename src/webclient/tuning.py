@@ -0,0 +1,107 @@
+import socket
+from socket import IPPROTO_TCP, SOL_SOCKET, TCP_NODELAY, SO_RCVBUF
+
+# Socket options (Linux), not all exposed by the socket module
+TCP_QUICKACK = getattr(socket, "TCP_QUICKACK", 12)
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+
+# Largest receive buffer the adaptive sizing grows to
+MAX_RECV_BUFFER_SIZE = 1 << 20  # 1M bytes
+
+
+class SocketProfile:
+    """Socket options and receive buffer sizing applied to the connections of a client
+
+    Options the platform does not support (or the process may not set, like busy polling
+    above net.core.busy_poll) are skipped. With `adaptive_recv`, the receive size starts at the
+    client buffer size and doubles whenever a read fills it or more bytes are already waiting,
+    up to `max_buffer_size`.
+    """
+
+    def __init__(
+        self,
+        nodelay=False,
+        quickack=False,
+        rcvbuf=None,
+        connect_timeout=None,
+        read_timeout=None,
+        busy_poll=None,
+        buffer_size=None,
+        adaptive_recv=False,
+        max_buffer_size=MAX_RECV_BUFFER_SIZE,
+    ):
+        self.nodelay = nodelay
+        self.quickack = quickack
+        self.rcvbuf = rcvbuf  # bytes
+        self.connect_timeout = connect_timeout  # seconds
+        self.read_timeout = read_timeout  # seconds
+        self.busy_poll = busy_poll  # microseconds
+        self.buffer_size = buffer_size  # initial receive size, bytes
+        self.adaptive_recv = adaptive_recv
+        self.max_buffer_size = max_buffer_size
+
+    def __repr__(self):
+        options = ", ".join(f"{name}={value!r}" for name, value in vars(self).items())
+        return f"SocketProfile({options})"
+
+    def replace(self, **changes):
+        """Copy of the profile with some options changed"""
+        return SocketProfile(**{**vars(self), **changes})
+
+    def setup(self, sock):
+        """Set the options that must be set before connecting"""
+        if self.rcvbuf:
+            # Before the handshake, so the window scale matches the buffer
+            sock.setsockopt(SOL_SOCKET, SO_RCVBUF, self.rcvbuf)
+
+    def apply(self, sock):
+        """Set the options of a connected socket"""
+        if self.nodelay:
+            sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        if self.quickack:
+            self.rearm(sock)
+        if self.busy_poll:
+            try:
+                sock.setsockopt(SOL_SOCKET, SO_BUSY_POLL, self.busy_poll)
+            except OSError:
+                # Not supported, or above the limit unprivileged processes may set
+                pass
+        sock.settimeout(self.read_timeout)
+
+    def rearm(self, sock):
+        """Set the options the kernel clears as the connection goes, after every read"""
+        if self.quickack:
+            try:
+                sock.setsockopt(IPPROTO_TCP, TCP_QUICKACK, 1)
+            except OSError:
+                pass
+
+    def next_recv_size(self, size, nbytes, queued=0):
+        """Receive size to use after a read of `nbytes` with `size`, `queued` bytes still waiting"""
+        if not self.adaptive_recv or size >= self.max_buffer_size:
+            return size
+        if nbytes >= size or queued:
+            return min(self.max_buffer_size, max(size * 2, queued))
+        return size
+
+
+# Named profiles selectable from the command line
+SOCKET_PROFILES = {
+    "default": SocketProfile(),
+    # Small requests and responses: no Nagle or delayed ACK, spin instead of sleeping
+    "low-latency": SocketProfile(
+        nodelay=True,
+        quickack=True,
+        busy_poll=50,
+        connect_timeout=5.0,
+        read_timeout=5.0,
+    ),
+    # Large downloads: big kernel buffer and receive size, few syscalls per MB
+    "bulk-throughput": SocketProfile(
+        rcvbuf=4 << 20,
+        buffer_size=64 << 10,
+        adaptive_recv=True,
+        connect_timeout=30.0,
+        read_timeout=60.0,
+    ),
+}
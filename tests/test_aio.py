@@ -0,0 +1,35 @@
+import asyncio
+import socket
+import unittest
+
+from webclient.aio import AsyncHTTPWebClient
+
+
+class AsyncClientTest(unittest.TestCase):
+    def test_unsupported_option_raises(self):
+        with self.assertRaises(ValueError):
+            AsyncHTTPWebClient("127.0.0.1", 443, "/", compression=True)
+
+    def test_cancelled_connect_closes_socket(self):
+        sockets = []
+
+        async def hang(sock, address):
+            sockets.append(sock)
+            await asyncio.Event().wait()
+
+        async def connect():
+            asyncio.get_running_loop().sock_connect = hang
+            client = AsyncHTTPWebClient("127.0.0.1", 80, "/")
+            client._start_trace()
+            client.timings.mark("resolved")
+            addresses = [(socket.AF_INET, ("127.0.0.1", 80))]
+            await asyncio.wait_for(client._connect_any(addresses), 0.05)
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run(connect())
+        self.assertEqual(len(sockets), 1)
+        self.assertEqual(sockets[0].fileno(), -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import socket
+import unittest
+
+from webclient.eyeballs import connect_happy_eyeballs
+
+
+class HappyEyeballsTest(unittest.TestCase):
+    def setUp(self):
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(self.listener.close)
+        self.address = self.listener.getsockname()
+
+    def test_setup_failure_only_fails_its_attempt(self):
+        created = []
+
+        def setup(sock):
+            created.append(sock)
+            if len(created) == 1:
+                raise OSError("option rejected")
+
+        addresses = [(socket.AF_INET, self.address), (socket.AF_INET, self.address)]
+        sock, attempts = connect_happy_eyeballs(addresses, setup=setup)
+        sock.close()
+        self.assertEqual(
+            [attempt["result"] for attempt in attempts],
+            ["option rejected", "connected"],
+        )
+        # The socket of the failed attempt is not leaked
+        self.assertEqual(created[0].fileno(), -1)
+
+    def test_all_setups_failing_raises(self):
+        def setup(sock):
+            raise OSError("option rejected")
+
+        with self.assertRaises(OSError):
+            connect_happy_eyeballs([(socket.AF_INET, self.address)], setup=setup)
+
+
+if __name__ == "__main__":
+    unittest.main()
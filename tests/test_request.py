@@ -0,0 +1,51 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webclient import HTTPWebClient
+
+BODY = b"content"
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class RequestTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), BodyHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.port = self.server.server_address[1]
+
+    def test_request_reads_body(self):
+        response = HTTPWebClient("127.0.0.1", self.port, "/").request()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text, BODY.decode())
+
+    def test_stream_after_request_has_no_marker(self):
+        client = HTTPWebClient("127.0.0.1", self.port, "/")
+        client.request().close()
+        chunks = [bytes(chunk) for chunk in client.stream()]
+        self.assertEqual(b"".join(chunks), BODY)
+        self.assertNotIn(b"", chunks)
+
+    def test_get_response_body_is_not_readable(self):
+        response = HTTPWebClient("127.0.0.1", self.port, "/").get()
+        self.assertEqual(response.status_code, 200)
+        with self.assertRaises(RuntimeError):
+            response.read()
+
+
+if __name__ == "__main__":
+    unittest.main()
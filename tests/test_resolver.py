@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+import unittest
+from socket import AF_INET
+from unittest import mock
+
+from webclient.resolver import Resolver
+
+
+class ResolverTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_file = os.path.join(directory.name, "dns.json")
+
+    def test_prefetch_saves_cache_file_once(self):
+        resolver = Resolver(cache_file=self.cache_file)
+        hosts = [f"host{index}" for index in range(20)]
+        with (
+            mock.patch.object(
+                resolver, "_lookup", return_value=[(AF_INET, ("127.0.0.1",))]
+            ),
+            mock.patch.object(resolver, "_save", wraps=resolver._save) as save,
+        ):
+            self.assertEqual(resolver.prefetch(hosts), {})
+        self.assertEqual(save.call_count, 1)
+        with open(self.cache_file) as f:
+            self.assertEqual(sorted(json.load(f)), sorted(hosts))
+
+    def test_prefetch_reports_hosts_without_address(self):
+        resolver = Resolver()
+        with mock.patch.object(resolver, "_lookup", return_value=[]):
+            self.assertEqual(list(resolver.prefetch(["nowhere"])), ["nowhere"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import gzip
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webclient import HTTPWebClient
+
+BODY = b"resumable body " * 1000
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    """Serve BODY gzip-encoded when the client accepts it"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = BODY
+        self.send_response(200)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ResumeTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), GzipHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output_file = os.path.join(directory.name, "body")
+
+    def test_resume_with_compression(self):
+        client = HTTPWebClient(
+            "127.0.0.1",
+            self.server.server_address[1],
+            "/",
+            output_file=self.output_file,
+            resume=True,
+            compression=True,
+        )
+        client.get()
+        with open(self.output_file, "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertFalse(os.path.exists(self.output_file + ".part"))
+
+
+if __name__ == "__main__":
+    unittest.main()
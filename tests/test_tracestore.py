@@ -0,0 +1,51 @@
+import os
+import tempfile
+import unittest
+
+from webclient.tracestore import TraceStore
+
+
+class TraceStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "traces.wct")
+
+    def test_append_and_read(self):
+        store = TraceStore(self.path)
+        store.append([100, 200], [0.5, 1.5], host="a", run=0)
+        store.append([300], [2.0], [4], host="b", run=0)
+
+        (entry,) = store.find(host="b")
+        columns = store.read(entry)
+        self.assertEqual(list(columns["sizes"]), [300])
+        self.assertEqual(list(columns["times"]), [2.0])
+        self.assertEqual(list(columns["queued"]), [4])
+        self.assertEqual(store.next_run(host="a"), 1)
+        store.close()
+
+    def test_append_after_torn_frame(self):
+        store = TraceStore(self.path)
+        store.append([100, 200], [0.5, 1.5], host="a", run=0)
+        store.append([300, 400], [2.0, 3.0], host="b", run=0)
+        # A crash while writing the last frame
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 5)
+
+        store = TraceStore(self.path)
+        self.assertEqual([entry["host"] for entry in store.index()], ["a"])
+        store.append([500], [4.0], host="h", run=0)
+
+        store = TraceStore(self.path)
+        self.assertEqual([entry["host"] for entry in store.index()], ["a", "h"])
+        (first,) = store.find(host="a")
+        (appended,) = store.find(host="h")
+        self.assertEqual(list(store.read(first)["sizes"]), [100, 200])
+        self.assertEqual(list(store.read(first)["times"]), [0.5, 1.5])
+        self.assertEqual(list(store.read(appended)["sizes"]), [500])
+        self.assertEqual(list(store.read(appended)["times"]), [4.0])
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()